@@ -0,0 +1,252 @@
+"""Stage-by-stage benchmark of the playground pipeline, run outside Streamlit.
+
+    python bench.py --rows 1000000 --output bench-1m.json
+    python bench.py --rows 1000000 --compare bench-1m.json
+
+The shared caches are cleared before the run. Each stage's first call is
+cold, and the ``*.cached`` stages repeat a call to time the warm path. Each
+stage's peak Python-tracked allocation is recorded with tracemalloc.
+tracemalloc does not see Arrow buffers (pyarrow-backed strings, sidecars,
+pages), so each stage also records the bytes it left allocated in Arrow's
+memory pool and the process's peak RSS after it. Results are written as JSON so runs from different commits can
+be compared.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import charts
+import cube
+import dataload
+import filters
+import instrument
+import lookup
+import paging
+import pipeline
+import synth
+import textsearch
+from cache import caches
+from dataload import DATASETS
+
+# A stage this much slower than the baseline is reported as a regression.
+REGRESSION_RATIO = 1.2
+
+
+def _max_rss() -> int:
+    """Peak resident set size of this process so far, in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _clear_caches() -> None:
+    dataload._FRAMES.clear()
+    for cache in caches():
+        cache.clear()
+
+
+class Bench:
+    def __init__(self, memory: bool = True):
+        self.memory = memory
+        self.stages = []
+
+    def run(self, stage: str, fn, rows_in: int = None):
+        """Time ``fn()``; a DataFrame or array result is counted as rows out."""
+        gc.collect()
+        if self.memory:
+            tracemalloc.start()
+        arrow_before = pa.total_allocated_bytes()
+        start = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - start
+        arrow = pa.total_allocated_bytes() - arrow_before
+        peak = None
+        if self.memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        record = {
+            "stage": stage,
+            "seconds": round(seconds, 6),
+            "peak_bytes": peak,
+            # Arrow memory the stage's result and caches still hold.
+            "arrow_bytes": arrow,
+            "max_rss_bytes": _max_rss(),
+            "rows_in": rows_in,
+        }
+        if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray)):
+            record["rows_out"] = int(result.sum()) if getattr(result, "dtype", None) == bool else len(result)
+        self.stages.append(record)
+        memory = f" {peak / 2**20:>9.1f} MiB" if peak is not None else ""
+        print(f"{stage:<32} {seconds:>9.3f}s{memory} {arrow / 2**20:>9.1f} MiB arrow")
+        return result
+
+    def note(self, stage: str, **values) -> None:
+        """Attach extra measurements (such as payload sizes) to ``stage``."""
+        next(s for s in reversed(self.stages) if s["stage"] == stage).update(values)
+
+
+def run_benchmarks(paths: dict, memory: bool = True) -> list:
+    bench = Bench(memory)
+    _clear_caches()
+    frames, versions = {}, {}
+    for name in ("claims", "pich", "broker", "brokeraccount"):
+        spec, path = DATASETS[name], paths[name]
+        frames[name] = bench.run(f"load.csv.{name}", lambda: dataload.read_csv(path, spec))
+        dataload.load_dataset(name, path)  # writes the Arrow sidecar
+        dataload._FRAMES.clear()
+        frames[name] = bench.run(f"load.sidecar.{name}", lambda: dataload.load_dataset(name, path))
+        bench.run(f"load.cached.{name}", lambda: dataload.load_dataset(name, path))
+        versions[name] = dataload.dataset_version(name, path)
+
+    broker, version = frames["broker"], versions["broker"]
+    n = len(broker)
+    profiles = bench.run("filter.profile", lambda: filters.column_profiles(broker, version), n)
+    bench.run("filter.profile.cached", lambda: filters.column_profiles(broker, version), n)
+    lob = profiles["Line of Business"]
+    bench.run("filter.categorical", lambda: np.isin(lob.codes, [0]), n)
+    times = profiles["Notification Time"].values
+    bench.run("filter.numeric", lambda: times.to_numpy(dtype="float64", na_value=np.nan) <= 10, n)
+    refs = broker["Claim reference"]
+    key = (version, "Claim reference")
+    bench.run("filter.text", lambda: textsearch.text_mask(refs, "AB1", key)[0], n)
+    bench.run("filter.text.cached", lambda: textsearch.text_mask(refs, "AB1", key)[0], n)
+    bench.run("filter.text.prefix", lambda: textsearch.text_mask(refs, "^CD", key)[0], n)
+
+    bench.run("table.page.first", lambda: paging.page(broker, 1, 100, key=version)[0], n)
+    bench.run("table.page.sorted", lambda: paging.page(broker, 5, 100, "Claim reference", key=version)[0], n)
+    bench.run("table.page.sorted.cached", lambda: paging.page(broker, 6, 100, "Claim reference", key=version)[0], n)
+    duplicates = bench.run("check.duplicates", lambda: pipeline.duplicated_rows(broker, "Claim reference", version), n)
+    bench.run("table.page.duplicates", lambda: paging.page(broker, 1, 100, "Claim reference", rows=duplicates, key=version)[0], n)
+
+    dedupe = pipeline.CLEANSING["broker"].steps[0]
+    bench.run("dedupe", lambda: dedupe.apply(broker), n)
+    cleaned = {}
+    for name in ("claims", "pich", "broker"):
+        run = lambda: pipeline.CLEANSING[name].run_with_key(frames[name], versions[name])
+        bench.run(f"cleanse.{name}", lambda: run()[0], len(frames[name]))
+        cleaned[name] = run()
+    clean_broker, clean_key = cleaned["broker"]
+
+    joined = bench.run(
+        "join.broker_names",
+        lambda: lookup.join_dimension(clean_broker, "brokeraccount", "Broker Account Number", clean_key, paths["brokeraccount"])[0].frame,
+        len(clean_broker),
+    )
+    broker_cube = bench.run("pivot.cube", lambda: cube.Cube(joined), len(joined))
+    for rows in (["Line of Business"], ["Broker Name", "Line of Business"], ["Broker Account Number"]):
+        bench.run(f"pivot.mean.{'+'.join(rows)}", lambda: broker_cube.mean(rows), len(joined))
+    bench.run("pivot.median.Line of Business", lambda: broker_cube.median(["Line of Business"]), len(joined))
+    bench.run(
+        "pivot.pivot_table",
+        lambda: pd.pivot_table(joined, values=list(cube.MEASURES), index=["Line of Business"], aggfunc="mean"),
+        len(joined),
+    )
+
+    clean_claims = cleaned["claims"][0]
+    bar = bench.run(
+        "chart.bar",
+        lambda: charts.count_bar_chart(clean_claims, "Line of Business", "Notification Type").to_json(),
+        len(clean_claims),
+    )
+    bench.note("chart.bar", payload_bytes=len(bar))
+    box = bench.run(
+        "chart.box",
+        lambda: charts.box_plot(joined, "Line of Business", "Notification Time").to_json(),
+        len(joined),
+    )
+    bench.note("chart.box", payload_bytes=len(box))
+    return bench.stages
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: list, baseline: list) -> list:
+    """Stages more than REGRESSION_RATIO slower than in ``baseline``."""
+    before = {s["stage"]: s["seconds"] for s in baseline}
+    regressions = []
+    for stage in current:
+        old = before.get(stage["stage"])
+        if old:
+            ratio = stage["seconds"] / old
+            print(f"{stage['stage']:<32} {old:>9.3f}s -> {stage['seconds']:>9.3f}s  x{ratio:.2f}")
+            if ratio > REGRESSION_RATIO:
+                regressions.append(stage["stage"])
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the claims playground headless.")
+    parser.add_argument("--rows", type=int, default=100_000, help="synthetic claims per extract")
+    parser.add_argument("--data", help="directory of existing extracts instead of generating them")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (faster, no peaks)")
+    parser.add_argument("--trace", help="also write the nested stage spans as a Chrome trace to this file")
+    args = parser.parse_args(argv)
+
+    workdir = args.data or tempfile.mkdtemp(prefix="claims-bench-")
+    try:
+        if args.data:
+            paths = {name: os.path.join(workdir, os.path.basename(spec.path)) for name, spec in DATASETS.items()}
+        else:
+            paths = synth.write_extracts(args.rows, workdir)
+        if args.trace:
+            instrument.enable()
+        stages = run_benchmarks(paths, memory=not args.no_memory)
+        if args.trace:
+            instrument.write_chrome_trace(args.trace)
+    finally:
+        if not args.data:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "rows": None if args.data else args.rows,
+            "data": args.data,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "stages": stages,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(stages, json.load(f)["stages"])
+        if regressions:
+            print(f"regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+
+_REGISTRY = []
+
+
+def caches() -> list:
+    """Every named cache, for diagnostics."""
+    return list(_REGISTRY)
+
+
+def _nbytes(value) -> int:
+    return getattr(value, "nbytes", 0)
+
+
+class LRUCache:
+    """Small thread-safe LRU cache shared by every Streamlit session.
+
+    With ``maxbytes`` the least recently used entries are also evicted once
+    the entries' ``sizeof`` (``.nbytes`` by default) adds up to more than
+    that; the newest entry is always kept.
+    """
+
+    def __init__(self, maxsize: int = 32, name: str = None, maxbytes: int = None, sizeof=_nbytes):
+        self.maxsize = maxsize
+        self.name = name
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+        if name is not None:
+            _REGISTRY.append(self)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            if self.maxbytes is not None:
+                self.nbytes += self.sizeof(value) - self._sizes.get(key, 0)
+                self._sizes[key] = self.sizeof(value)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize or (
+                self.maxbytes is not None and self.nbytes > self.maxbytes and len(self._data) > 1
+            ):
+                old, _ = self._data.popitem(last=False)
+                self.nbytes -= self._sizes.pop(old, 0)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for ``key``, calling ``compute()`` on a miss."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.nbytes = 0
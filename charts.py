@@ -0,0 +1,138 @@
+"""Server-side aggregation for the playground charts.
+
+Charts are built from group counts and box-plot summaries computed here, so
+the chart spec sent to the browser grows with the number of groups rather
+than the number of claims.
+"""
+import altair as alt
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from cache import LRUCache
+from instrument import span
+
+COUNT = "Count of Records"
+# Outlier points drawn per box; the rest are summarised by the whiskers.
+MAX_OUTLIERS = 200
+# Box quartiles as plotly.js computes them (quartilemethod="linear").
+QUARTILE_METHOD = "hazen"
+
+_SUMMARIES = LRUCache(maxsize=64, name="charts.summaries")
+
+
+def _cached(key, kind: str, params: tuple, compute):
+    with span(f"chart.{kind}"):
+        if key is None:
+            return compute()
+        return _SUMMARIES.get_or_compute((key, kind, params), compute)
+
+
+def count_by(df: pd.DataFrame, columns: list, key=None) -> pd.DataFrame:
+    """Row counts per combination of ``columns``, the server-side ``count()``."""
+    compute = lambda: df.groupby(list(columns), sort=False, observed=True).size().rename(COUNT).reset_index()
+    return _cached(key, "count_by", tuple(columns), compute)
+
+
+def count_bar_chart(df: pd.DataFrame, x: str, color: str, key=None) -> alt.Chart:
+    """Stacked bar chart of row counts, as ``encode(x, y="count()", color)`` draws it."""
+    counts = count_by(df, [x, color], key)
+    return alt.Chart(counts).mark_bar().encode(alt.X(x), y=alt.Y(f"{COUNT}:Q", title=COUNT), color=color)
+
+
+def indicator_counts(df: pd.DataFrame, indicators: dict, by: str, key=None) -> pd.DataFrame:
+    """Count rows whose boolean indicator column is set, split by ``by``.
+
+    ``indicators`` maps the label drawn in the chart to the indicator column.
+    """
+    def compute():
+        frames = []
+        for label, column in indicators.items():
+            flagged = df.loc[df[column].fillna(False).to_numpy(dtype=bool), by]
+            counts = flagged.value_counts(sort=False).rename_axis(by).rename("Count of Claims").reset_index()
+            counts.insert(0, "PI/CH", label)
+            frames.append(counts)
+        return pd.concat(frames, ignore_index=True)
+    return _cached(key, "indicator_counts", (tuple(indicators.items()), by), compute)
+
+
+def box_summary(df: pd.DataFrame, x: str, y: str, key=None) -> tuple:
+    """Five-number summary per ``x`` group and a capped sample of outliers.
+
+    Quartiles interpolate at rank ``p * n - 0.5`` (Hazen) and the whiskers
+    reach the furthest point within 1.5 IQR, matching plotly's own box
+    statistics.
+    """
+    def compute():
+        data = df[[x, y]].dropna().astype({y: "float64"})
+        grouped = data.groupby(x, sort=False, observed=True)[y]
+        stats = grouped.apply(lambda v: pd.Series(
+            np.quantile(v.to_numpy(), [0.25, 0.5, 0.75], method=QUARTILE_METHOD),
+            index=["q1", "median", "q3"],
+        )).unstack()
+        iqr = stats["q3"] - stats["q1"]
+        low = data[x].map(stats["q1"] - 1.5 * iqr).astype("float64")
+        high = data[x].map(stats["q3"] + 1.5 * iqr).astype("float64")
+        inside = (data[y] >= low) & (data[y] <= high)
+        fences = data[inside].groupby(x, sort=False, observed=True)[y].agg(["min", "max"])
+        stats["lowerfence"] = fences["min"]
+        stats["upperfence"] = fences["max"]
+        outliers = data[~inside]
+        if len(outliers):
+            rng = np.random.default_rng(0)
+            outliers = outliers.groupby(x, sort=False, observed=True, group_keys=False).apply(
+                lambda g: g if len(g) <= MAX_OUTLIERS else g.iloc[rng.choice(len(g), MAX_OUTLIERS, replace=False)]
+            )
+        return stats.reset_index(), outliers.reset_index(drop=True)
+    return _cached(key, "box_summary", (x, y), compute)
+
+
+def box_summary_from_cube(cube, x: str, y: str) -> tuple:
+    """:func:`box_summary` from a :class:`~cube.Cube` instead of rows.
+
+    ``x`` is a cube row label and ``y`` one of its measures. Outliers come
+    back as value counts (every one of them) rather than a sample of points.
+    """
+    column = cube.labels[x]
+    stats = pd.DataFrame({
+        name: cube.quantile([x], y, q, QUARTILE_METHOD)
+        for name, q in (("q1", 0.25), ("median", 0.5), ("q3", 0.75))
+    })
+    counts = cube.sketches[y].groupby([column, y], observed=True)["n"].sum()
+    counts = counts[counts > 0].reset_index()
+    iqr = stats["q3"] - stats["q1"]
+    low = counts[column].map(stats["q1"] - 1.5 * iqr).astype("float64")
+    high = counts[column].map(stats["q3"] + 1.5 * iqr).astype("float64")
+    inside = (counts[y] >= low) & (counts[y] <= high)
+    fences = counts[inside].groupby(column, sort=False)[y].agg(["min", "max"])
+    stats["lowerfence"] = fences["min"]
+    stats["upperfence"] = fences["max"]
+    outliers = counts[~inside].rename(columns={column: x, "n": COUNT})
+    return stats.rename_axis(x).reset_index(), outliers.reset_index(drop=True)
+
+
+def box_plot(df: pd.DataFrame, x: str, y: str, key=None) -> go.Figure:
+    """Plotly box plot drawn from :func:`box_summary` instead of raw rows."""
+    stats, outliers = box_summary(df, x, y, key)
+    color = "#636efa"
+    fig = go.Figure()
+    fig.add_trace(go.Box(
+        x=stats[x].astype(str),
+        q1=stats["q1"],
+        median=stats["median"],
+        q3=stats["q3"],
+        lowerfence=stats["lowerfence"],
+        upperfence=stats["upperfence"],
+        marker_color=color,
+        boxpoints=False,
+        showlegend=False,
+    ))
+    fig.add_trace(go.Scatter(
+        x=outliers[x].astype(str),
+        y=outliers[y],
+        mode="markers",
+        marker_color=color,
+        showlegend=False,
+    ))
+    fig.update_layout(xaxis_title=x, yaxis_title=y, template="plotly")
+    return fig
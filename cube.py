@@ -0,0 +1,183 @@
+"""Pre-aggregated cube for the broker notification time / lifecycle pivots.
+
+The cube stores, for every combination of the dimension columns present in
+the data, the sum and count of each measure, plus a value-count sketch of
+the measures that need medians. Sums, counts and value counts are all mergeable, so any set of row
+dimensions - in any order - is answered by rolling up the stored cells
+rather than rescanning the claims.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_categorical_dtype
+
+from cache import LRUCache
+from instrument import span
+
+# Multiselect label -> column name in the (joined) broker data.
+DIMENSIONS = {
+    "Line of Business": "Line of Business",
+    "Broker Account Number": "Broker Account Number",
+    "Broker Name": "Broker Name ",
+    "Policy Holder": "Policy Holder",
+}
+MEASURES = ("Notification Time", "Lifecycle")
+
+_CUBES = LRUCache(maxsize=16, name="cube.cubes")
+
+
+def _group_index(keys: pd.DataFrame) -> pd.Index:
+    if keys.shape[1] == 1:
+        return pd.Index(keys.iloc[:, 0])
+    return pd.MultiIndex.from_frame(keys)
+
+
+def _plain(cells: pd.DataFrame) -> pd.DataFrame:
+    # Cells are few, so store dimensions as plain values: categorical
+    # dimensions would otherwise roll up in category order, not sorted.
+    return cells.astype({c: object for c in cells.columns if is_categorical_dtype(cells[c])})
+
+
+def _signed(cells: pd.DataFrame, keys: list, sign: int) -> pd.DataFrame:
+    if sign > 0:
+        return cells
+    values = [c for c in cells.columns if c not in keys]
+    return cells.assign(**{c: -cells[c] for c in values})
+
+
+def _combine(parts: list, keys: list, count: str) -> pd.DataFrame:
+    """Sum cells with the same ``keys`` and drop cells left without rows."""
+    cells = pd.concat(parts, ignore_index=True)
+    cells = cells.groupby(keys, dropna=False, sort=False).sum().reset_index()
+    return _plain(cells[cells[count] > 0].reset_index(drop=True))
+
+
+class Cube:
+    """Roll-up cube over ``measures``.
+
+    Only the measures in ``quantiles`` keep a value-count sketch, which
+    medians and other quantiles need. A sketch has a cell per distinct value,
+    so for measures such as pence amounts it is about as large as the data.
+    """
+
+    def __init__(self, df: pd.DataFrame, dimensions: dict = None, measures=MEASURES, quantiles=MEASURES):
+        dimensions = DIMENSIONS if dimensions is None else dimensions
+        self.labels = {label: col for label, col in dimensions.items() if col in df.columns}
+        self.measures = [m for m in measures if m in df.columns]
+        dims = list(self.labels.values())
+        # Measures may be stored in small integer types; aggregate in float64.
+        df = df[dims].join(df[self.measures].astype("float64"))
+        # dropna=False keeps cells whose other dimensions are missing, so a
+        # roll-up only drops rows missing one of the dimensions it groups by.
+        grouped = df.groupby(dims, dropna=False, observed=True, sort=False)
+        base = grouped[self.measures].agg(["sum", "count"])
+        base.columns = [f"{m}:{stat}" for m, stat in base.columns]
+        base["rows"] = grouped.size()
+        self.base = _plain(base.reset_index())
+        self.sketches = {
+            m: _plain(df.groupby(dims + [m], dropna=False, observed=True, sort=False).size().rename("n").reset_index())
+            for m in self.measures
+            if m in quantiles
+        }
+        self._rollups = {}
+
+    def update(self, added: pd.DataFrame = None, removed: pd.DataFrame = None) -> "Cube":
+        """A new cube with the ``added`` rows counted in and the ``removed`` rows
+        taken out, without revisiting the rows already aggregated.
+
+        Every cell is a sum, a count or a value count, so taking rows out is
+        subtracting the cells of a cube built from just those rows.
+        """
+        cube = self
+        for frame, sign in ((added, 1), (removed, -1)):
+            if frame is not None and len(frame):
+                cube = cube.merge(Cube(frame, self.labels, self.measures, tuple(self.sketches)), sign)
+        return cube
+
+    def merge(self, other: "Cube", sign: int = 1) -> "Cube":
+        """A new cube holding the cells of both cubes added together, or with
+        ``other``'s cells subtracted when ``sign`` is -1."""
+        dims = list(self.labels.values())
+        cube = Cube.__new__(Cube)
+        cube.labels = dict(self.labels)
+        cube.measures = list(self.measures)
+        cube.base = _combine([self.base, _signed(other.base, dims, sign)], dims, "rows")
+        cube.sketches = {
+            m: _combine([self.sketches[m], _signed(other.sketches[m], dims + [m], sign)], dims + [m], "n")
+            for m in self.sketches
+        }
+        cube._rollups = {}
+        return cube
+
+    def _value_columns(self):
+        for m in self.measures:
+            yield f"{m}:sum"
+            yield f"{m}:count"
+
+    def missing(self, labels: list) -> list:
+        """Row labels that this cube cannot group by."""
+        return [label for label in labels if label not in self.labels]
+
+    def rollup(self, labels: list) -> pd.DataFrame:
+        """Sum and count of every measure grouped by ``labels``, in that order."""
+        key = tuple(labels)
+        if key not in self._rollups:
+            cols = [self.labels[label] for label in labels]
+            rolled = self.base.groupby(cols, observed=True)[list(self._value_columns())].sum()
+            rolled.index.names = list(labels)
+            self._rollups[key] = rolled
+        return self._rollups[key]
+
+    def mean(self, labels: list, measures: list = None) -> pd.DataFrame:
+        """Equivalent of ``pivot_table(index=labels, values=measures, aggfunc=np.mean)``."""
+        with span("pivot.mean", rows_in=len(self.base)):
+            rolled = self.rollup(labels)
+            measures = sorted(measures or self.measures)
+            return pd.DataFrame(
+                {m: rolled[f"{m}:sum"] / rolled[f"{m}:count"].replace(0, np.nan) for m in measures},
+                index=rolled.index,
+            )
+
+    def median(self, labels: list, measures: list = None) -> pd.DataFrame:
+        measures = sorted(measures or self.measures)
+        with span("pivot.median", rows_in=len(self.base)):
+            return pd.DataFrame({m: self.quantile(labels, m, 0.5) for m in measures})
+
+    def quantile(self, labels: list, measure: str, q: float = 0.5, method: str = "linear") -> pd.Series:
+        """Exact ``q`` quantile of ``measure`` per group, from the value-count sketch.
+
+        ``method`` is ``"linear"`` (pandas' and ``np.quantile``'s default) or
+        ``"hazen"``, which plotly's box plots use.
+        """
+        if measure not in self.sketches:
+            raise ValueError(f"{measure!r} has no value-count sketch; build the cube with it in quantiles")
+        cols = [self.labels[label] for label in labels]
+        cells = self.sketches[measure].groupby(cols + [measure], observed=True)["n"].sum()
+        cells = cells[cells > 0].reset_index()
+        grouped = cells.groupby(cols, sort=False)["n"]
+        upto = grouped.cumsum().to_numpy()
+        before = upto - cells["n"].to_numpy()
+        # Rank of the q-th value within its group, split into the two
+        # neighbouring ranks np.quantile interpolates between.
+        total = grouped.transform("sum").to_numpy()
+        if method == "hazen":
+            pos = np.clip(q * total - 0.5, 0, total - 1)
+        else:
+            pos = q * (total - 1)
+        low, high = np.floor(pos), np.ceil(pos)
+        values = cells[measure].to_numpy(dtype="float64")
+        at_low = (before <= low) & (low < upto)
+        at_high = (before <= high) & (high < upto)
+        low_values = pd.Series(values[at_low], index=_group_index(cells.loc[at_low, cols]))
+        high_values = pd.Series(values[at_high], index=_group_index(cells.loc[at_high, cols]))
+        frac = pd.Series((pos - low)[at_low], index=low_values.index)
+        out = low_values + (high_values - low_values) * frac
+        out.index.names = list(labels)
+        return out.rename(measure)
+
+
+def cube_for(df: pd.DataFrame, key, dimensions: dict = None, measures=MEASURES, quantiles=MEASURES) -> Cube:
+    """Build the cube for a frame once per dataset or pipeline fingerprint ``key``."""
+    dimensions = DIMENSIONS if dimensions is None else dimensions
+    cache_key = (key, tuple(dimensions.items()), tuple(measures), tuple(quantiles))
+    with span("pivot.cube", rows_in=len(df)):
+        return _CUBES.get_or_compute(cache_key, lambda: Cube(df, dimensions, measures, quantiles))
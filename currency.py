@@ -0,0 +1,50 @@
+"""Parsing of ``£``-formatted money columns into integer pence."""
+import numpy as np
+import pandas as pd
+
+# "£10,975 ", "£0", "-£12.50", "1234.5" - optional sign, pound sign,
+# thousands separators and up to two decimal places.
+_AMOUNT = r"^\s*(?P<sign>-)?\s*£?\s*(?P<pounds>\d{1,3}(?:,\d{3})+|\d+)(?:\.(?P<pence>\d{1,2}))?\s*$"
+
+
+class CurrencyError(ValueError):
+    """Raised when a money column holds values that are not amounts."""
+
+
+def parse_pence(s: pd.Series) -> pd.Series:
+    """Convert ``£``-formatted strings to pence.
+
+    Each distinct string is parsed once and the result is broadcast back
+    through the factorized codes. Blank cells become missing values, so the
+    result is ``int64`` when the column is complete and ``Int64`` otherwise.
+    Any other value that is not an amount raises :class:`CurrencyError`.
+    """
+    codes, uniques = pd.factorize(s)
+    if not len(uniques):
+        # Every cell is blank, such as Amount paid in an extract of open claims.
+        return pd.Series(pd.NA, index=s.index, name=s.name, dtype="Int64")
+    text = pd.Series(uniques, dtype=object).astype(str)
+    blank = (text.str.strip() == "").to_numpy()
+    if blank.any():
+        codes = np.where(np.isin(codes, np.flatnonzero(blank)), -1, codes)
+    parts = text.str.extract(_AMOUNT)
+    bad = parts["pounds"].isna().to_numpy() & ~blank
+    if bad.any():
+        rows = np.flatnonzero(np.isin(codes, np.flatnonzero(bad)))
+        examples = ", ".join(repr(v) for v in uniques[bad][:5])
+        raise CurrencyError(
+            f"{s.name}: {len(rows)} malformed amounts (first at row {s.index[rows[0]]}): {examples}"
+        )
+    pounds = parts["pounds"].fillna("0").str.replace(",", "", regex=False).astype("int64").to_numpy()
+    pence = parts["pence"].fillna("0").str.ljust(2, "0").astype("int64").to_numpy()
+    values = pounds * 100 + pence
+    values[parts["sign"].notna().to_numpy()] *= -1
+    result = values[codes]
+    missing = codes < 0
+    if missing.any():
+        return pd.Series(pd.arrays.IntegerArray(np.where(missing, 0, result), missing), index=s.index, name=s.name)
+    return pd.Series(result, index=s.index, name=s.name)
+
+
+def format_pounds(pence) -> str:
+    return f"£{pence / 100:,.2f}"
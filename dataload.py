@@ -0,0 +1,286 @@
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from currency import parse_pence
+from instrument import span
+
+SIDECAR_DIR = ".cache"
+# Sidecars of an extract not read for this long are deleted when it gets a new one.
+SIDECAR_MAX_AGE = 7 * 24 * 3600
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    """Explicit schema and storage profile for one of the playground CSV extracts.
+
+    Enumerations are read as categoricals and references as Arrow-backed
+    strings, so no column is left as Python ``object`` storage.
+    """
+
+    path: str
+    dtypes: dict
+    dates: tuple = ()
+    date_format: str = "%d/%m/%Y"
+    # "£1,234 " style columns, stored as integer pence.
+    money: tuple = ()
+    # Y/N columns, stored as nullable booleans.
+    flags: tuple = ()
+    # Whole-number columns, downcast to the smallest integer type that fits.
+    integers: tuple = ()
+
+    def fingerprint(self) -> str:
+        return hashlib.sha1(repr(self).encode()).hexdigest()[:12]
+
+
+DATASETS = {
+    "claims": DatasetSpec(
+        path="claims.csv",
+        dtypes={
+            "Claim reference": "string[pyarrow]",
+            "Line of Business": "category",
+            "Notification Type": "category",
+            "Claim Status": "category",
+            "Amount incurred": "object",
+            "Amount paid": "object",
+        },
+        dates=("Notification date",),
+        money=("Amount incurred", "Amount paid"),
+    ),
+    "pich": DatasetSpec(
+        path="PICHclaims.csv",
+        dtypes={
+            "Claim reference": "string[pyarrow]",
+            "Blame Code": "category",
+            "Vehicle Make ": "category",
+            "PI Indicator": "object",
+            "CH Indicator": "object",
+            "Latest Record ": "object",
+        },
+        dates=("Notification date",),
+        flags=("PI Indicator", "CH Indicator", "Latest Record "),
+    ),
+    "broker": DatasetSpec(
+        path="broker.csv",
+        dtypes={
+            "Claim reference": "string[pyarrow]",
+            "Line of Business": "category",
+            "Claim Status": "category",
+            "Notification Time": "float64",
+            "Lifecycle": "float64",
+            "Broker Account Number": "category",
+            "Policy Number": "string[pyarrow]",
+        },
+        dates=("Notification date",),
+        integers=("Notification Time", "Lifecycle"),
+    ),
+    "brokeraccount": DatasetSpec(
+        path="brokeraccount.csv",
+        dtypes={
+            "Broker Account Number": "float64",
+            "Broker Name ": "string[pyarrow]",
+        },
+    ),
+}
+
+# path -> (stat key, frame, memory-mapped sidecar table or None). Imported
+# modules survive Streamlit reruns, so this is shared by every rerun and every
+# session in the process.
+_FRAMES = {}
+_LOCK = threading.Lock()
+
+_INTEGER_TYPES = ("int8", "int16", "int32", "int64")
+
+
+def _stat_key(path: str, spec: DatasetSpec) -> tuple:
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size, spec.fingerprint())
+
+
+def _sidecar_path(key: tuple) -> str:
+    path, mtime_ns, size, schema = key
+    directory = os.path.join(os.path.dirname(path), SIDECAR_DIR)
+    name = f"{os.path.basename(path)}.{size}-{mtime_ns}-{schema}.arrow"
+    return os.path.join(directory, name)
+
+
+def parse_flags(s: pd.Series) -> pd.Series:
+    """Y/N strings to a nullable boolean; anything else is missing."""
+    yes = (s == "Y").to_numpy(dtype=bool, na_value=False)
+    no = (s == "N").to_numpy(dtype=bool, na_value=False)
+    return pd.Series(pd.arrays.BooleanArray(yes, ~(yes | no)), index=s.index, name=s.name)
+
+
+def downcast_integers(s: pd.Series) -> pd.Series:
+    """Store whole numbers in the smallest integer type, nullable if there are gaps."""
+    values = s.to_numpy(dtype="float64", na_value=np.nan)
+    present = ~np.isnan(values)
+    if not present.any() or (values[present] % 1).any():
+        return s
+    low, high = values[present].min(), values[present].max()
+    dtype = next(t for t in _INTEGER_TYPES if np.iinfo(t).min <= low and high <= np.iinfo(t).max)
+    if present.all():
+        return s.astype(dtype)
+    return s.astype(dtype.capitalize())
+
+
+def read_csv(path, spec: DatasetSpec) -> pd.DataFrame:
+    """Parse a CSV extract (a path or buffer) with the dtypes and storage profile declared in ``spec``."""
+    df = pd.read_csv(path, dtype=spec.dtypes, encoding="utf-8-sig")
+    for col in spec.dates:
+        df[col] = pd.to_datetime(df[col], format=spec.date_format, errors="coerce")
+    for col in spec.money:
+        df[col] = parse_pence(df[col])
+    for col in spec.flags:
+        df[col] = parse_flags(df[col])
+    for col in spec.integers:
+        df[col] = downcast_integers(df[col])
+    return df
+
+
+def read_arrow_table(path: str) -> pa.Table:
+    """Memory-map an uncompressed Arrow file written by :func:`write_arrow`."""
+    return feather.read_table(path, memory_map=True)
+
+
+def to_pandas(table: pa.Table) -> pd.DataFrame:
+    # Keep string columns Arrow-backed instead of materialising Python str objects.
+    return table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+
+def read_arrow(path: str) -> pd.DataFrame:
+    """Memory-map an uncompressed Arrow file written by :func:`write_arrow`."""
+    return to_pandas(read_arrow_table(path))
+
+
+def write_arrow(df: pd.DataFrame, path: str) -> None:
+    """Write ``df`` as uncompressed Arrow IPC, replacing ``path`` atomically."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        feather.write_feather(df, tmp, compression="uncompressed")
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _write_sidecar(df: pd.DataFrame, sidecar: str) -> None:
+    try:
+        write_arrow(df, sidecar)
+    except OSError:
+        # A read-only checkout still works, it just parses the CSV each start.
+        pass
+
+
+def _prune_sidecars(sidecar: str, source: str) -> None:
+    """Delete other sidecars of the same extract that nothing has read lately.
+
+    Another process may still be on an older version of the file or schema,
+    so only sidecars untouched for SIDECAR_MAX_AGE (reads refresh the
+    modification time) and not loaded in this process go.
+    """
+    directory = os.path.dirname(sidecar)
+    prefix = f"{os.path.basename(source)}."
+    live = {_sidecar_path(cached[0]) for cached in list(_FRAMES.values())}
+    cutoff = time.time() - SIDECAR_MAX_AGE
+    try:
+        for other in os.listdir(directory):
+            path = os.path.join(directory, other)
+            if other.startswith(prefix) and other.endswith(".arrow") and path != sidecar and path not in live:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+    except OSError:
+        pass
+
+
+def _read(key: tuple, spec: DatasetSpec) -> tuple:
+    sidecar = _sidecar_path(key)
+    if os.path.exists(sidecar):
+        try:
+            # Mark the sidecar as in use, so pruning keeps it.
+            os.utime(sidecar)
+        except OSError:
+            pass
+        with span("load.sidecar"):
+            # Uncompressed Arrow IPC is memory-mapped rather than parsed.
+            table = read_arrow_table(sidecar)
+            return to_pandas(table), table
+    with span("load.csv"):
+        df = read_csv(key[0], spec)
+    with span("load.write_sidecar"):
+        _write_sidecar(df, sidecar)
+        _prune_sidecars(sidecar, key[0])
+    table = read_arrow_table(sidecar) if os.path.exists(sidecar) else None
+    return df, table
+
+
+def dataset_version(name: str, path: str = None) -> tuple:
+    """Cache token for a dataset: changes when the file or its schema changes."""
+    spec = DATASETS[name]
+    return (name,) + _stat_key(path or spec.path, spec)
+
+
+def dataset_table(version: tuple):
+    """The memory-mapped sidecar of a loaded :func:`dataset_version`, or ``None``.
+
+    Its rows are the rows of :func:`load_dataset`'s frame, in order, so pages
+    of the frame can be sliced from it without an Arrow copy.
+    """
+    if not (isinstance(version, tuple) and len(version) == 5 and version[0] in DATASETS):
+        return None
+    cached = _FRAMES.get(version[1])
+    if cached is None or cached[0] != version[1:]:
+        return None
+    return cached[2]
+
+
+def load_dataset(name: str, path: str = None) -> pd.DataFrame:
+    """Return the typed frame for ``name``, parsing the CSV only when it changed.
+
+    The returned frame is shared between reruns and sessions - never modify it
+    in place.
+    """
+    with span(f"load.{name}") as s:
+        df = _load(name, path)
+        s.rows_out = len(df)
+        return df
+
+
+def _load(name: str, path: str = None) -> pd.DataFrame:
+    spec = DATASETS[name]
+    key = _stat_key(path or spec.path, spec)
+    cached = _FRAMES.get(key[0])
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with _LOCK:
+        cached = _FRAMES.get(key[0])
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        df, table = _read(key, spec)
+        _FRAMES[key[0]] = (key, df, table)
+        return df
+
+
+_REPORTS = {}
+
+
+def memory_report(name: str, path: str = None) -> pd.DataFrame:
+    """Deep memory use per column: plain ``pd.read_csv`` versus the profiled frame."""
+    version = dataset_version(name, path)
+    if version not in _REPORTS:
+        spec = DATASETS[name]
+        before = pd.read_csv(path or spec.path, encoding="utf-8-sig").memory_usage(index=False, deep=True)
+        after = load_dataset(name, path).memory_usage(index=False, deep=True)
+        report = pd.DataFrame({"before (bytes)": before, "after (bytes)": after})
+        report.loc["total"] = report.sum()
+        report["reduction"] = (report["before (bytes)"] / report["after (bytes)"]).round(1)
+        _REPORTS[version] = report
+    return _REPORTS[version]
@@ -0,0 +1,150 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import (
+    is_categorical_dtype,
+    is_datetime64_any_dtype,
+    is_numeric_dtype,
+    is_object_dtype,
+)
+
+from cache import LRUCache
+from instrument import span
+from textsearch import text_mask
+
+# Rows tried before committing to a full datetime conversion of an object column.
+DATETIME_SAMPLE = 1000
+# Categoricals with more values than this get the text filter, not a multiselect.
+MAX_OPTIONS = 1000
+
+_PROFILES = LRUCache(maxsize=16, name="filters.profiles")
+
+
+@dataclass
+class ColumnProfile:
+    """Everything the filter widgets need to know about one column."""
+
+    kind: str
+    values: pd.Series
+    nunique: int
+    min: object = None
+    max: object = None
+    codes: np.ndarray = None
+    uniques: list = None
+
+
+def _coerce_datetime(s: pd.Series) -> pd.Series:
+    if is_object_dtype(s):
+        sample = s.dropna().iloc[:DATETIME_SAMPLE]
+        try:
+            pd.to_datetime(sample)
+            s = pd.to_datetime(s)
+        except Exception:
+            return s
+    if is_datetime64_any_dtype(s):
+        s = s.dt.tz_localize(None)
+    return s
+
+
+def profile_column(s: pd.Series) -> ColumnProfile:
+    s = _coerce_datetime(s)
+    nunique = s.nunique()
+    if nunique < 10 or (is_categorical_dtype(s) and nunique <= MAX_OPTIONS):
+        codes, uniques = pd.factorize(s)
+        uniques = list(uniques)
+        if (codes == -1).any():
+            uniques.append(np.nan)
+        return ColumnProfile("categorical", s, nunique, codes=codes, uniques=uniques)
+    if is_numeric_dtype(s):
+        return ColumnProfile("numeric", s, nunique, float(s.min()), float(s.max()))
+    if is_datetime64_any_dtype(s):
+        return ColumnProfile("datetime", s, nunique, s.min(), s.max())
+    return ColumnProfile("text", s, nunique)
+
+
+def column_profiles(df: pd.DataFrame, version=None) -> dict:
+    """Profile every column of ``df``, once per dataset ``version``."""
+    compute = lambda: {col: profile_column(df[col]) for col in df.columns}
+    with span("filter.profile", rows_in=len(df)):
+        if version is None:
+            return compute()
+        return _PROFILES.get_or_compute(version, compute)
+
+
+def _and(mask, cond):
+    # Conditions may be cached arrays, so never combine them in place.
+    return cond if mask is None else mask & cond
+
+
+def filter_mask(df: pd.DataFrame, version=None):
+    """Draw the filter widgets and return the boolean row mask they select,
+    or ``None`` when every row passes."""
+    # Imported here so the profiling and masking stay usable without Streamlit.
+    import streamlit as st
+
+    modify = st.checkbox("Add filters", key="1")
+
+    if not modify:
+        return None
+
+    profiles = column_profiles(df, version)
+    mask = None
+
+    modification_container = st.container()
+
+    with modification_container:
+        to_filter_columns = st.multiselect("Filter dataframe on", df.columns)
+        for column in to_filter_columns:
+            profile = profiles[column]
+            left, right = st.columns((1, 20))
+            left.write("↳")
+
+            if profile.kind == "categorical":
+                user_cat_input = right.multiselect(
+                    f"Values for {column}",
+                    profile.uniques,
+                    default=profile.uniques,
+                )
+                if len(user_cat_input) < len(profile.uniques):
+                    lookup = {v: i for i, v in enumerate(profile.uniques) if not pd.isna(v)}
+                    selected = [-1 if pd.isna(v) else lookup[v] for v in user_cat_input]
+                    mask = _and(mask, np.isin(profile.codes, selected))
+            elif profile.kind == "numeric":
+                _min, _max = profile.min, profile.max
+                step = (_max - _min) / 100
+                user_num_input = right.slider(
+                    f"Values for {column}",
+                    _min,
+                    _max,
+                    (_min, _max),
+                    step=step,
+                )
+                if user_num_input != (_min, _max):
+                    values = profile.values.to_numpy(dtype="float64", na_value=np.nan)
+                    low, high = user_num_input
+                    mask = _and(mask, (values >= low) & (values <= high))
+            elif profile.kind == "datetime":
+                user_date_input = right.date_input(
+                    f"Values for {column}",
+                    value=(
+                        profile.min,
+                        profile.max,
+                    ),
+                )
+                if len(user_date_input) == 2:
+                    start_date, end_date = map(pd.to_datetime, user_date_input)
+                    mask = _and(mask, profile.values.between(start_date, end_date).to_numpy())
+            else:
+                user_text_input = right.text_input(
+                    f"Substring or regex in {column}",
+                )
+                if user_text_input:
+                    key = None if version is None else (version, column)
+                    with span("filter.text", rows_in=len(df)):
+                        matches, error = text_mask(profile.values, user_text_input, key)
+                    if error:
+                        right.caption(f"Not a valid regex ({error}) - matching it as plain text")
+                    mask = _and(mask, matches)
+
+    return mask
@@ -0,0 +1,483 @@
+"""Append-only ingestion of claim batches with upsert on Claim reference.
+
+Each appended CSV batch is parsed with the dataset's storage profile and
+written to the store as an Arrow partition. A keyed index keeps one record
+per claim, pointing at the partition and row that currently hold it:
+
+* a later record replaces an earlier one;
+* where the dataset carries a latest-record flag (PICH's ``Latest Record ``),
+  a flagged record is never replaced by an unflagged one.
+
+Value counts and a pivot cube are kept up to date from each batch alone:
+the rows it adds are counted in and the records it supersedes are
+subtracted out. Compaction rewrites the partitions as a single base
+partition holding only the current records. It runs in a background thread
+once enough batches have accumulated.
+
+The manifest is checked again whenever the records are read, so batches
+appended by another process (such as this CLI while the app is running) are
+replayed into an open store, and its compactions trigger a reload. Every
+change to the manifest happens under a lock file in the store directory, so
+concurrent writers never reuse a batch number or lose a compaction. Base
+partitions get unique names, and only files the manifest no longer names are
+deleted.
+
+    python ingest.py append pich batch-0001.csv batch-0002.csv
+    python ingest.py status pich
+    python ingest.py compact pich
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cube import DIMENSIONS, MEASURES, Cube
+from dataload import DATASETS, SIDECAR_DIR, read_arrow, read_csv, write_arrow
+from instrument import span
+from pipeline import CLEANSING
+
+try:
+    import fcntl
+except ImportError:  # Windows: one writer per store at a time
+    fcntl = None
+
+STORE_DIR = os.path.join(SIDECAR_DIR, "store")
+# Appended partitions that trigger a background compaction.
+COMPACT_AFTER = 8
+
+# Positions pack a partition id and a row into one int64 for sorting.
+_ROW_BITS = 40
+# Initial capacity of the per-claim index arrays, which double as they fill.
+_MIN_CAPACITY = 1024
+
+
+@dataclass(frozen=True)
+class IngestSpec:
+    key: str = "Claim reference"
+    # Boolean column marking the current record; ``None`` means the last one wins.
+    latest_flag: str = None
+    # Columns whose value counts are maintained.
+    counts: tuple = ()
+    # Pivot cube maintained over the current records.
+    dimensions: dict = None
+    measures: tuple = ()
+    # Measures whose medians the cube can answer.
+    quantiles: tuple = ()
+    # Whether the cube counts records after the row-level cleansing steps.
+    cleansed: bool = False
+
+
+INGEST = {
+    "claims": IngestSpec(
+        counts=("Line of Business", "Notification Type", "Claim Status"),
+        dimensions={"Line of Business": "Line of Business"},
+        measures=("Amount incurred", "Amount paid"),
+    ),
+    "pich": IngestSpec(
+        latest_flag="Latest Record ",
+        counts=("Blame Code", "Vehicle Make ", "PI Indicator", "CH Indicator"),
+    ),
+    "broker": IngestSpec(
+        counts=("Broker Account Number", "Policy Number"),
+        dimensions=DIMENSIONS,
+        measures=MEASURES,
+        quantiles=MEASURES,
+        cleansed=True,
+    ),
+}
+
+
+def _value_counts(s: pd.Series) -> pd.Series:
+    counts = s.value_counts(sort=False)
+    counts.index = counts.index.astype(object)
+    return counts
+
+
+class Store:
+    """The partitions, keyed index and running aggregates of one dataset."""
+
+    def __init__(self, name: str, root: str = STORE_DIR):
+        self.name = name
+        self.spec = DATASETS[name]
+        self.ingest = INGEST[name]
+        self.directory = os.path.join(root, name)
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._compactor = None
+        self._frame = None
+        self._manifest_stat = None
+        self._locked = 0
+        with self._lock, self._writing():
+            self._load()
+
+    # -- persistence ---------------------------------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _writing(self):
+        """Hold the store's inter-process lock around reading partitions or a
+        manifest read-modify-write. Callers hold ``self._lock``; re-entrant."""
+        if self._locked:
+            self._locked += 1
+            try:
+                yield
+            finally:
+                self._locked -= 1
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path("manifest.lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self._locked = 1
+            try:
+                yield
+            finally:
+                self._locked = 0
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _stat_manifest(self) -> tuple:
+        try:
+            st = os.stat(self._path("manifest.json"))
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _read_manifest(self) -> dict:
+        self._manifest_stat = self._stat_manifest()
+        try:
+            with open(self._path("manifest.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"generation": 0, "base": None, "batches": [], "next_batch": 1}
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            "generation": self.generation,
+            "base": self.base,
+            "batches": self.batches,
+            "next_batch": self.next_batch,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._path(f"manifest.json.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._path("manifest.json"))
+        self._manifest_stat = self._stat_manifest()
+
+    def _load(self, manifest: dict = None) -> None:
+        manifest = self._read_manifest() if manifest is None else manifest
+        self.generation = manifest["generation"]
+        self.base = manifest["base"]
+        self.batches = []
+        self.next_batch = manifest["next_batch"]
+        # Partition id -> frame; 0 is the compacted base, batches count from 1.
+        self.parts = {}
+        # Claim reference -> slot in the part/row/latest arrays.
+        self.slots = {}
+        self._part = np.empty(_MIN_CAPACITY, dtype="int64")
+        self._row = np.empty(_MIN_CAPACITY, dtype="int64")
+        self._latest = np.empty(_MIN_CAPACITY, dtype=bool)
+        self.counts = {col: pd.Series(dtype="int64") for col in self.ingest.counts}
+        self.cube = None
+        self._frame = None
+        # Replaying the partitions in order rebuilds the index and aggregates.
+        if self.base:
+            self._add_part(0, read_arrow(self._path(self.base)))
+        self._replay(manifest["batches"])
+
+    def _replay(self, batches: list) -> None:
+        for seq in batches:
+            self._add_part(seq, read_arrow(self._path(f"batch-{seq:06d}.arrow")))
+            self.batches.append(seq)
+
+    def refresh(self) -> None:
+        """Catch up with batches and compactions written by other processes.
+
+        New batches are replayed into the index and aggregates; a compaction
+        elsewhere replaces the partitions, so the store is reloaded.
+        """
+        with self._lock:
+            if self._stat_manifest() == self._manifest_stat:
+                return
+            # Partitions are only deleted under the lock, so the files the
+            # manifest names stay readable until this catch-up is done.
+            with self._writing():
+                manifest = self._read_manifest()
+                if manifest["generation"] != self.generation or manifest["base"] != self.base:
+                    with span(f"ingest.{self.name}.reload"):
+                        self._load(manifest)
+                    return
+                new = [seq for seq in manifest["batches"] if seq not in self.parts]
+                with span(f"ingest.{self.name}.replay", batches=len(new)):
+                    self._replay(new)
+                self.next_batch = max(self.next_batch, manifest["next_batch"])
+
+    # -- keyed index ---------------------------------------------------
+
+    @property
+    def part(self) -> np.ndarray:
+        """Partition holding each claim's current record, by slot."""
+        return self._part[:len(self.slots)]
+
+    @property
+    def row(self) -> np.ndarray:
+        return self._row[:len(self.slots)]
+
+    @property
+    def latest(self) -> np.ndarray:
+        return self._latest[:len(self.slots)]
+
+    def _grow(self, extra: int) -> None:
+        # Doubling keeps appends O(batch) amortised rather than copying every
+        # slot on every batch.
+        need = len(self.slots) + extra
+        if need <= len(self._part):
+            return
+        capacity = max(need, 2 * len(self._part))
+        for name in ("_part", "_row", "_latest"):
+            old = getattr(self, name)
+            grown = np.empty(capacity, dtype=old.dtype)
+            grown[:len(self.slots)] = old[:len(self.slots)]
+            setattr(self, name, grown)
+
+    # -- upsert --------------------------------------------------------
+
+    def _flags(self, frame: pd.DataFrame) -> np.ndarray:
+        if self.ingest.latest_flag is None:
+            return np.ones(len(frame), dtype=bool)
+        return frame[self.ingest.latest_flag].to_numpy(dtype=bool, na_value=False)
+
+    def _add_part(self, part: int, frame: pd.DataFrame) -> tuple:
+        """Index partition ``part`` and fold it into the aggregates.
+
+        Returns the number of claims inserted and replaced.
+        """
+        self.parts[part] = frame
+        keys = frame[self.ingest.key].to_numpy(dtype=object)
+        # One dictionary key for every kind of missing reference.
+        keys[pd.isna(keys)] = None
+        flags = self._flags(frame)
+        # Within the batch the last row of a claim wins, flagged rows ahead of unflagged.
+        order = np.lexsort((np.arange(len(frame)), flags))
+        winners = order[~pd.Series(keys[order]).duplicated(keep="last").to_numpy()]
+        get = self.slots.get
+        found = np.fromiter((get(k, -1) for k in keys[winners]), dtype=np.intp, count=len(winners))
+        old = found >= 0
+        flagged = np.zeros(len(found), dtype=bool)
+        flagged[old] = self.latest[found[old]]
+        wins = ~old | flags[winners] | ~flagged
+        replace = old & wins
+        insert = ~old
+
+        slots = found[replace]
+        removed = self._gather(self.part[slots], self.row[slots])
+        self.part[slots] = part
+        self.row[slots] = winners[replace]
+        self.latest[slots] = flags[winners[replace]]
+        new = winners[insert]
+        self._grow(len(new))
+        start, stop = len(self.slots), len(self.slots) + len(new)
+        self._part[start:stop] = part
+        self._row[start:stop] = new
+        self._latest[start:stop] = flags[new]
+        self.slots.update(zip(keys[new], range(start, stop)))
+
+        self._update_aggregates(frame.iloc[np.sort(winners[wins])], removed)
+        return int(insert.sum()), int(replace.sum())
+
+    def _gather(self, parts: np.ndarray, rows: np.ndarray) -> pd.DataFrame:
+        pieces = [self.parts[p].iloc[rows[parts == p]] for p in np.unique(parts)]
+        return pd.concat(pieces, ignore_index=True) if pieces else None
+
+    def _cube_rows(self, frame: pd.DataFrame) -> pd.DataFrame:
+        if self.ingest.cleansed:
+            return CLEANSING[self.name].apply_row_steps(frame)
+        return frame
+
+    def _update_aggregates(self, added: pd.DataFrame, removed: pd.DataFrame) -> None:
+        for col in self.ingest.counts:
+            counts = self.counts[col].add(_value_counts(added[col]), fill_value=0)
+            if removed is not None:
+                counts = counts.sub(_value_counts(removed[col]), fill_value=0)
+            self.counts[col] = counts[counts > 0].astype("int64")
+        if self.ingest.dimensions is None:
+            return
+        added = self._cube_rows(added)
+        if self.cube is None:
+            self.cube = Cube(added, self.ingest.dimensions, self.ingest.measures, self.ingest.quantiles)
+        else:
+            self.cube = self.cube.update(added, None if removed is None else self._cube_rows(removed))
+
+    # -- public API ----------------------------------------------------
+
+    def append(self, path: str) -> tuple:
+        """Ingest a CSV batch; returns the claims inserted and replaced."""
+        batch = read_csv(path, self.spec)
+        with span(f"ingest.{self.name}.append", rows_in=len(batch)), self._lock, self._writing():
+            # Another process may have appended since: do not reuse its number.
+            self.refresh()
+            seq = self.next_batch
+            partition = self._path(f"batch-{seq:06d}.arrow")
+            write_arrow(batch, partition)
+            changed = self._add_part(seq, read_arrow(partition))
+            self.batches.append(seq)
+            self.next_batch = seq + 1
+            self._write_manifest()
+            pending = len(self.batches)
+        if pending >= COMPACT_AFTER:
+            self.compact_in_background()
+        return changed
+
+    def version(self) -> tuple:
+        """Cache token for the current records; changes with every batch and compaction."""
+        self.refresh()
+        return ("store", self.name, os.path.abspath(self.directory), self.generation, self.next_batch)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def _positions(self) -> tuple:
+        order = np.lexsort((self.row, self.part))
+        return self.part[order], self.row[order]
+
+    def frame(self) -> tuple:
+        """The current record of every claim, in arrival order, and its version.
+
+        The frame is shared by every caller - never modify it in place.
+        """
+        with self._lock:
+            version = self.version()
+            if self._frame is not None and self._frame[0] == version:
+                return self._frame[1], version
+            with span(f"ingest.{self.name}.frame", rows_in=len(self)) as s:
+                parts, rows = self._positions()
+                bounds = np.flatnonzero(np.diff(parts)) + 1
+                pieces = [
+                    self.parts[p[0]].iloc[r]
+                    for p, r in zip(np.split(parts, bounds), np.split(rows, bounds))
+                    if len(p)
+                ]
+                df = pd.concat(pieces, ignore_index=True) if pieces else pd.DataFrame(columns=list(self.spec.dtypes))
+                # Batches infer their own categories, which concat widens to object.
+                categories = [c for c, t in self.spec.dtypes.items() if t == "category" and df[c].dtype != "category"]
+                df = df.astype({c: "category" for c in categories})
+                s.rows_out = len(df)
+            self._frame = (version, df)
+            return df, version
+
+    def value_counts(self, column: str) -> pd.Series:
+        """``frame()[column].value_counts()`` from the running counts."""
+        self.refresh()
+        return self.counts[column].sort_values(ascending=False, kind="stable").rename(column)
+
+    def compact(self) -> None:
+        """Rewrite every partition as one base partition of the current records."""
+        with self._compact_lock:
+            with self._lock:
+                if not self.batches:
+                    return
+                df, _ = self.frame()
+                parts, rows = self._positions()
+                compacted = set(self.parts)
+                generation = self.generation + 1
+            with span(f"ingest.{self.name}.compact", rows_in=len(df)):
+                # Unique, so a concurrent compaction never writes the same file.
+                base = f"base-{generation:06d}-{uuid.uuid4().hex[:12]}.arrow"
+                write_arrow(df, self._path(base))
+                frame = read_arrow(self._path(base))
+            snapshot = (parts << _ROW_BITS) | rows
+            with self._lock, self._writing():
+                self.refresh()
+                if self.generation != generation - 1:
+                    # Another process compacted meanwhile; this base is out of date
+                    # and, being uniquely named, referenced by nobody.
+                    os.remove(self._path(base))
+                    return
+                # Claims replaced by a batch appended meanwhile already point past
+                # the compacted partitions; the rest move to their base row.
+                moved = np.isin(self.part, list(compacted))
+                self.row[moved] = np.searchsorted(snapshot, (self.part[moved] << _ROW_BITS) | self.row[moved])
+                self.part[moved] = 0
+                stale = [self.base] if self.base else []
+                stale += [f"batch-{seq:06d}.arrow" for seq in self.batches if seq in compacted]
+                for part in compacted:
+                    del self.parts[part]
+                self.parts[0] = frame
+                self.base = base
+                self.batches = [seq for seq in self.batches if seq not in compacted]
+                self.generation = generation
+                self._write_manifest()
+                # Only files the manifest just dropped, under the lock readers
+                # take to catch up.
+                for name in stale:
+                    os.remove(self._path(name))
+
+    def compact_in_background(self) -> threading.Thread:
+        with self._lock:
+            if self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(target=self.compact, name=f"compact-{self.name}", daemon=True)
+                self._compactor.start()
+            return self._compactor
+
+    def wait(self) -> None:
+        """Block until a background compaction has finished."""
+        if self._compactor is not None:
+            self._compactor.join()
+
+
+_STORES = {}
+_LOCK = threading.Lock()
+
+
+def has_store(name: str, root: str = STORE_DIR) -> bool:
+    return os.path.exists(os.path.join(root, name, "manifest.json"))
+
+
+def open_store(name: str, root: str = STORE_DIR) -> Store:
+    """The process-wide :class:`Store` for ``name``, opened once."""
+    key = (name, os.path.abspath(root))
+    with _LOCK:
+        if key not in _STORES:
+            _STORES[key] = Store(name, root)
+        return _STORES[key]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Append claim batches to an ingestion store.")
+    parser.add_argument("command", choices=("append", "compact", "status", "export"))
+    parser.add_argument("dataset", choices=sorted(INGEST))
+    parser.add_argument("files", nargs="*", help="CSV batches to append, oldest first")
+    parser.add_argument("--root", default=STORE_DIR, help="store directory")
+    parser.add_argument("--output", help="export: CSV to write (defaults to stdout)")
+    args = parser.parse_args(argv)
+
+    store = Store(args.dataset, args.root)
+    if args.command == "append":
+        for path in args.files:
+            inserted, replaced = store.append(path)
+            print(f"{path}: {inserted} new claims, {replaced} replaced")
+        store.wait()
+    elif args.command == "compact":
+        store.compact()
+    elif args.command == "export":
+        df, _ = store.frame()
+        if args.output:
+            df.to_csv(args.output, index=False)
+        else:
+            print(df.to_csv(index=False), end="")
+    status = f"{args.dataset}: {len(store)} claims, {len(store.batches)} batches since the last compaction"
+    print(status, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Lightweight per-rerun instrumentation.
+
+Wrap a stage in ``with span("cleanse.broker", rows_in=len(df)) as s:`` and
+set ``s.rows_out`` when it is known. While tracing is disabled (the default)
+``span`` returns a shared no-op object, so spans can stay in the hot path.
+
+Enabled spans record wall time, rows in and out, the hits and misses of
+the shared caches while the span was open, and how much the process's Arrow
+memory pool and resident set size grew over the span. Cache counters and
+both memory figures are process-wide, so a concurrent session's work can
+show up in another session's spans; they are read, never reset, so tracing
+one session does not disturb another. ``bench.py`` measures each stage's
+peak Python allocations in isolation.
+:func:`cache_stats` reports the running totals per cache.
+:func:`jsonl` and :func:`chrome_trace` export the spans for offline
+analysis. The Chrome format opens in chrome://tracing or Perfetto.
+"""
+import json
+import os
+import threading
+import time
+
+import pyarrow as pa
+
+from cache import caches
+
+# Streamlit runs each session's script in its own thread, so tracing is
+# switched on per thread and one session's diagnostics do not slow another.
+_state = threading.local()
+
+
+class _NoSpan:
+    rows_out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span:
+    def __init__(self, name: str, rows_in: int = None, **attrs):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.attrs = attrs
+        self.start = None
+        self.seconds = None
+        self.cache_hits = None
+        self.cache_misses = None
+        self.process_arrow_bytes = None
+        self.process_rss_bytes = None
+        self.depth = 0
+
+    def __enter__(self):
+        stack = _stack()
+        self.depth = len(stack)
+        stack.append(self)
+        self._hits, self._misses = _cache_totals()
+        self._arrow, self._rss = pa.total_allocated_bytes(), _rss()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        stack = _stack()
+        stack.pop()
+        hits, misses = _cache_totals()
+        self.cache_hits, self.cache_misses = hits - self._hits, misses - self._misses
+        self.process_arrow_bytes = pa.total_allocated_bytes() - self._arrow
+        rss = _rss()
+        if rss is not None and self._rss is not None:
+            self.process_rss_bytes = rss - self._rss
+        _spans().append(self)
+        return False
+
+    def to_dict(self) -> dict:
+        record = {
+            "name": self.name,
+            "start": self.start,
+            "seconds": self.seconds,
+            "depth": self.depth,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "process_arrow_bytes": self.process_arrow_bytes,
+            "process_rss_bytes": self.process_rss_bytes,
+        }
+        record.update(self.attrs)
+        return record
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else None
+
+
+def _rss() -> int:
+    """Current resident set size of the process in bytes, where /proc has it."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, TypeError):
+        return None
+
+
+def _cache_totals() -> tuple:
+    hits = misses = 0
+    for cache in caches():
+        hits += cache.hits
+        misses += cache.misses
+    return hits, misses
+
+
+def _stack() -> list:
+    if not hasattr(_state, "stack"):
+        _state.stack = []
+    return _state.stack
+
+
+def _spans() -> list:
+    if not hasattr(_state, "spans"):
+        _state.spans = []
+    return _state.spans
+
+
+def enable() -> None:
+    """Trace this thread."""
+    _state.enabled = True
+
+
+def disable() -> None:
+    _state.enabled = False
+
+
+def span(name: str, rows_in: int = None, **attrs):
+    if not getattr(_state, "enabled", False):
+        return _NO_SPAN
+    return Span(name, rows_in, **attrs)
+
+
+def start_rerun() -> None:
+    """Forget the spans of this thread's previous rerun."""
+    _spans().clear()
+
+
+def spans() -> list:
+    """Spans finished in this thread since :func:`start_rerun`, in completion order."""
+    return list(_spans())
+
+
+def cache_stats() -> dict:
+    """Running hit/miss counts and sizes of every named cache."""
+    return {cache.name: {"hits": cache.hits, "misses": cache.misses, "entries": len(cache)}
+            for cache in caches()}
+
+
+def jsonl(records: list = None) -> str:
+    """Spans (this rerun's by default) as JSON lines."""
+    records = spans() if records is None else records
+    return "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in records)
+
+
+def chrome_trace(records: list = None) -> str:
+    """Spans in the Chrome trace event format, as complete ("X") events."""
+    records = spans() if records is None else records
+    events = [
+        {
+            "name": s.name,
+            "ph": "X",
+            "ts": s.start * 1e6,
+            "dur": s.seconds * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {k: v for k, v in s.to_dict().items() if k not in ("name", "start", "seconds") and v is not None},
+        }
+        for s in records
+    ]
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, default=str)
+
+
+def write_chrome_trace(path: str, records: list = None) -> None:
+    with open(path, "w") as f:
+        f.write(chrome_trace(records))
@@ -0,0 +1,86 @@
+"""Keyed reference-table lookups used instead of ``pd.merge``.
+
+A reference (dimension) table such as brokeraccount is indexed once on a
+normalised key. Fact tables are enriched by factorizing their key column,
+resolving only the distinct keys against the index, and taking the
+reference attributes through the resulting codes.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import take
+
+from cache import LRUCache
+from dataload import dataset_version, load_dataset
+from instrument import span
+
+_DIMENSIONS = LRUCache(maxsize=8, name="lookup.dimensions")
+_ENRICHED = LRUCache(maxsize=16, name="lookup.enriched")
+
+
+def normalise_keys(s: pd.Series) -> pd.Series:
+    """Render keys as trimmed strings so 11111, 11111.0 and "11111 " all match."""
+    keys = s.astype(str).str.strip().str.replace(r"\.0+$", "", regex=True)
+    return keys.where(s.notna())
+
+
+@dataclass
+class Enriched:
+    frame: pd.DataFrame
+    unmatched_rows: int
+    unmatched_keys: list
+
+
+class Dimension:
+    def __init__(self, df: pd.DataFrame, key: str):
+        keys = normalise_keys(df[key])
+        keep = keys.notna() & ~keys.duplicated()
+        self.key = key
+        self.index = pd.Index(keys[keep].to_numpy())
+        self.attributes = df.loc[keep.to_numpy(), [c for c in df.columns if c != key]].reset_index(drop=True)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def enrich(self, fact: pd.DataFrame, fact_key: str = None) -> Enriched:
+        """Left-join the dimension attributes onto ``fact`` by key."""
+        fact_key = fact_key or self.key
+        codes, uniques = pd.factorize(fact[fact_key])
+        found = self.index.get_indexer(normalise_keys(pd.Series(uniques)))
+        positions = np.where(codes >= 0, found[codes], -1)
+        extra = pd.DataFrame(
+            {
+                col: take(self.attributes[col].to_numpy(), positions, allow_fill=True)
+                for col in self.attributes.columns
+            },
+            index=fact.index,
+        )
+        missing = (codes >= 0) & (positions < 0)
+        unmatched_keys = [uniques[i] for i in np.flatnonzero(found < 0)]
+        frame = pd.concat([fact, extra], axis=1, copy=False)
+        return Enriched(frame, int(missing.sum()), unmatched_keys)
+
+
+def dimension_for(name: str, key: str, path: str = None) -> Dimension:
+    """The indexed reference table for dataset ``name``, rebuilt only when it changes."""
+    version = dataset_version(name, path)
+    return _DIMENSIONS.get_or_compute((version, key), lambda: Dimension(load_dataset(name, path), key))
+
+
+def join_dimension(fact: pd.DataFrame, name: str, key: str, fact_key=None, path: str = None) -> tuple:
+    """Enrich ``fact`` from reference dataset ``name``.
+
+    Returns the :class:`Enriched` result and a cache token for the joined
+    frame. With ``fact_key`` (the fact frame's pipeline fingerprint) the join
+    itself is cached too.
+    """
+    with span(f"join.{name}", rows_in=len(fact)) as s:
+        dimension = dimension_for(name, key, path)
+        token = (fact_key, dataset_version(name, path), key)
+        if fact_key is None:
+            enriched = dimension.enrich(fact, key)
+        else:
+            enriched = _ENRICHED.get_or_compute(token, lambda: dimension.enrich(fact, key))
+        s.rows_out = len(enriched.frame)
+        return enriched, token
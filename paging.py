@@ -0,0 +1,117 @@
+"""Paged table view over the cached frames.
+
+Instead of serialising a whole frame to the browser, :func:`show_table`
+sends one page at a time. Pages of a loaded dataset are cut from its
+memory-mapped Arrow sidecar: an unsorted, unfiltered page is a zero-copy
+``Table.slice``, otherwise the page's row positions are taken from it. For
+any other frame only the page's rows are converted to Arrow. Sorting uses a cached permutation per
+column and direction. A row selection (a filter or check mask) is applied to
+that permutation, so changing the filter never re-sorts.
+"""
+import json
+import math
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from cache import LRUCache
+from dataload import dataset_table
+from instrument import span
+
+PAGE_SIZES = (25, 50, 100, 500)
+UNSORTED = "(original order)"
+
+_ORDERS = LRUCache(maxsize=32, name="paging.orders")
+
+
+def _with_labels(table: pa.Table, labels: np.ndarray) -> pa.Table:
+    """Add ``labels`` to rows cut from a sidecar as the pandas row labels, as
+    ``Table.from_pandas(preserve_index=True)`` would."""
+    meta = json.loads(table.schema.metadata[b"pandas"])
+    meta["index_columns"] = ["__index_level_0__"]
+    meta["columns"].append(
+        {"name": None, "field_name": "__index_level_0__", "pandas_type": "int64", "numpy_type": "int64", "metadata": None}
+    )
+    table = table.append_column("__index_level_0__", pa.array(labels, type=pa.int64()))
+    return table.replace_schema_metadata({**table.schema.metadata, b"pandas": json.dumps(meta).encode()})
+
+
+def sort_order(df: pd.DataFrame, column: str, ascending: bool = True, key=None) -> np.ndarray:
+    """Row positions of ``df`` sorted by ``column``, missing values last."""
+    def compute():
+        values = df[column].reset_index(drop=True)
+        return values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+    if key is None:
+        return compute()
+    return _ORDERS.get_or_compute((key, column, ascending), compute)
+
+
+def select_rows(n: int, rows=None, order: np.ndarray = None):
+    """Positions to page through: ``rows`` (a boolean mask or positions) in
+    ``order``. Returns ``None`` for all rows in their original order."""
+    if rows is not None and rows.dtype == bool:
+        if order is None:
+            return np.flatnonzero(rows)
+        return order[rows[order]]
+    if rows is not None:
+        if order is None:
+            return rows
+        keep = np.zeros(n, dtype=bool)
+        keep[rows] = True
+        return order[keep[order]]
+    return order
+
+
+def page(df: pd.DataFrame, number: int, size: int, sort: str = None, ascending: bool = True, rows=None, key=None) -> tuple:
+    """Page ``number`` (from 1) of ``size`` rows, and the total row count.
+
+    ``rows`` restricts the view to a boolean mask or array of positions.
+    With ``key`` (the frame's dataset version or pipeline fingerprint) the
+    sort permutations are reused across reruns; a dataset version pages
+    straight from the memory-mapped sidecar.
+    """
+    with span("table.page", rows_in=len(df)) as s:
+        order = None if sort is None else sort_order(df, sort, ascending, key)
+        positions = select_rows(len(df), rows, order)
+        total = len(df) if positions is None else len(positions)
+        start = (number - 1) * size
+        stop = min(start + size, total)
+        sidecar = dataset_table(key) if key is not None else None
+        if sidecar is not None and sidecar.num_rows == len(df):
+            # Loaded datasets have a default RangeIndex: labels are positions.
+            if positions is None:
+                table = _with_labels(sidecar.slice(start, stop - start), np.arange(start, stop))
+            else:
+                table = _with_labels(sidecar.take(positions[start:stop]), positions[start:stop])
+        else:
+            # No sidecar to slice: convert just this page.
+            taken = df.iloc[start:stop] if positions is None else df.iloc[positions[start:stop]]
+            table = pa.Table.from_pandas(taken, preserve_index=True)
+        s.rows_out = table.num_rows
+        return table, total
+
+
+def show_table(df: pd.DataFrame, key=None, rows=None, name: str = "table") -> int:
+    """Render a paged, sortable view of ``df`` and return its total row count.
+
+    ``name`` keeps the widgets of several tables on one page apart.
+    """
+    # Imported here so paging stays usable without Streamlit, as in bench.py.
+    import streamlit as st
+
+    sort_col, order_col, size_col, page_col = st.columns((3, 2, 2, 2))
+    sort = sort_col.selectbox("Sort by", (UNSORTED,) + tuple(df.columns), key=f"{name}-sort")
+    ascending = order_col.radio("Order", ("Ascending", "Descending"), key=f"{name}-order", horizontal=True) == "Ascending"
+    size = size_col.selectbox("Rows per page", PAGE_SIZES, key=f"{name}-size")
+    total = len(df) if rows is None else int(rows.sum() if rows.dtype == bool else len(rows))
+    pages = max(1, math.ceil(total / size))
+    page_key = f"{name}-page"
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    number = page_col.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, step=1, key=page_key)
+    table, total = page(df, int(number), size, None if sort == UNSORTED else sort, ascending, rows, key)
+    st.dataframe(table)
+    first = (int(number) - 1) * size
+    st.caption(f"Rows {min(first + 1, total):,}-{first + table.num_rows:,} of {total:,}")
+    return total
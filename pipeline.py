@@ -0,0 +1,197 @@
+"""Declarative cleansing pipelines for the playground datasets.
+
+Run headless with ``python pipeline.py broker --output broker_clean.csv``.
+"""
+import argparse
+import hashlib
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from dataload import DATASETS, dataset_version, load_dataset
+from instrument import span
+
+# Step outputs are whole frames, so bound them by size as well as count.
+_STEP_OUTPUTS = LRUCache(
+    maxsize=64,
+    name="pipeline.step_outputs",
+    maxbytes=1024 * 2**20,
+    sizeof=lambda df: int(df.memory_usage(deep=False).sum()),
+)
+_CHECKS = LRUCache(maxsize=16, name="pipeline.checks")
+
+
+def drop_duplicates(df: pd.DataFrame, subset: str) -> pd.DataFrame:
+    return df.drop_duplicates(subset=subset)
+
+
+def _too_short(s: pd.Series, length: int) -> np.ndarray:
+    return s.str.len().to_numpy(dtype="float64", na_value=0) < length
+
+
+def min_length(df: pd.DataFrame, column: str, length: int) -> pd.DataFrame:
+    keep = ~_too_short(df[column], length)
+    return df if keep.all() else df[keep]
+
+
+def dropna(df: pd.DataFrame) -> pd.DataFrame:
+    return df.dropna()
+
+
+def replace(df: pd.DataFrame, mapping: dict) -> pd.DataFrame:
+    """Replace values per column, ``mapping`` being ``{column: {old: new}}``."""
+    return df.replace(mapping)
+
+
+def drop_values(df: pd.DataFrame, column: str, values: list) -> pd.DataFrame:
+    keep = ~df[column].isin(values).to_numpy()
+    return df if keep.all() else df[keep]
+
+
+STEP_FUNCTIONS = {
+    "drop_duplicates": drop_duplicates,
+    "min_length": min_length,
+    "dropna": dropna,
+    "replace": replace,
+    "drop_values": drop_values,
+}
+# Steps whose result for a row depends on other rows; every other step keeps
+# or changes each row on its own, so it can be applied to any slice of a dataset.
+SET_FUNCTIONS = {"drop_duplicates"}
+
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    func: str
+    params: dict = field(default_factory=dict)
+
+    def key(self) -> str:
+        return f"{self.name}:{self.func}:{sorted(self.params.items())!r}"
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        return STEP_FUNCTIONS[self.func](df, **self.params)
+
+
+def _check(key, kind: str, params: tuple, compute) -> np.ndarray:
+    if key is None:
+        return compute()
+    return _CHECKS.get_or_compute((key, kind, params), compute)
+
+
+def duplicated_rows(df: pd.DataFrame, subset: str, key=None) -> np.ndarray:
+    """Boolean mask of the rows ``drop_duplicates`` would remove."""
+    return _check(key, "duplicated", (subset,), lambda: df.duplicated(subset=subset).to_numpy())
+
+
+def short_rows(df: pd.DataFrame, column: str, length: int, key=None) -> np.ndarray:
+    """Boolean mask of the rows ``min_length`` would remove."""
+    return _check(key, "short", (column, length), lambda: _too_short(df[column], length))
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash for frames that did not come from the dataset loader."""
+    hashed = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+
+class Pipeline:
+    """An ordered list of cleansing steps whose outputs are memoized.
+
+    Each step's output is cached under a fingerprint chained from the
+    fingerprint of its input and its own parameters, so asking for a later
+    stage reuses every earlier stage that is already cached.
+    """
+
+    def __init__(self, dataset: str, steps: list):
+        self.dataset = dataset
+        self.steps = steps
+
+    def step_names(self) -> list:
+        return [step.name for step in self.steps]
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Run every step without caching, for one-off batch work."""
+        for step in self.steps:
+            df = step.apply(df)
+        return df
+
+    def apply_row_steps(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Apply every step except de-duplication, uncached, e.g. to a batch of new rows."""
+        for step in self.steps:
+            if step.func not in SET_FUNCTIONS:
+                df = step.apply(df)
+        return df
+
+    def run(self, df: pd.DataFrame = None, version=None, until: str = None) -> pd.DataFrame:
+        """Clean ``df`` (the loaded dataset by default) up to and including ``until``."""
+        return self.run_with_key(df, version, until)[0]
+
+    def run_with_key(self, df: pd.DataFrame = None, version=None, until: str = None) -> tuple:
+        """Like :meth:`run` but also return the output's fingerprint."""
+        if until is not None and until not in self.step_names():
+            raise KeyError(f"{self.dataset} pipeline has no step {until!r}")
+        if df is None:
+            df = load_dataset(self.dataset)
+            version = dataset_version(self.dataset)
+        key = version if version is not None else frame_fingerprint(df)
+        for step in self.steps:
+            key = hashlib.sha1(f"{key!r}|{step.key()}".encode()).hexdigest()
+            with span(f"cleanse.{self.dataset}.{step.name}", rows_in=len(df)) as s:
+                df = _STEP_OUTPUTS.get_or_compute(key, lambda df=df, step=step: step.apply(df))
+                s.rows_out = len(df)
+            if step.name == until:
+                break
+        return df, key
+
+
+_REFERENCE_STEPS = [
+    Step("dedupe", "drop_duplicates", {"subset": "Claim reference"}),
+    Step("complete_refs", "min_length", {"column": "Claim reference", "length": 8}),
+]
+
+CLEANSING = {
+    "claims": Pipeline("claims", _REFERENCE_STEPS),
+    "pich": Pipeline("pich", _REFERENCE_STEPS + [
+        Step("vehicle_makes", "replace", {"mapping": {"Vehicle Make ": {
+            "Mercedes": "Mercedes Benz",
+            "VW": "Volkswagen",
+            "Vord": "Ford",
+            "Mercedes-Benz": "Mercedes Benz",
+            "Scoda": "Skoda",
+            "Peugot": "Peugeot",
+        }}}),
+    ]),
+    "broker": Pipeline("broker", _REFERENCE_STEPS + [
+        Step("drop_incomplete", "dropna"),
+        # PK12488 was keyed into the account field and 68623 into the policy field.
+        Step("swap_broker_policy", "replace", {"mapping": {
+            "Broker Account Number": {"PK12488": "68623"},
+            "Policy Number": {"68623": "PK12488"},
+        }}),
+        Step("drop_invalid_accounts", "drop_values", {"column": "Broker Account Number", "values": ["X"]}),
+    ]),
+}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run a cleansing pipeline over a CSV extract.")
+    parser.add_argument("dataset", choices=sorted(CLEANSING))
+    parser.add_argument("--input", help="CSV to clean (defaults to the bundled extract)")
+    parser.add_argument("--output", help="where to write the cleaned CSV (defaults to stdout)")
+    parser.add_argument("--until", help="stop after this step")
+    args = parser.parse_args(argv)
+
+    path = args.input or DATASETS[args.dataset].path
+    df = load_dataset(args.dataset, path)
+    cleaned = CLEANSING[args.dataset].run(df, dataset_version(args.dataset, path), args.until)
+    if args.output:
+        cleaned.to_csv(args.output, index=False)
+    else:
+        print(cleaned.to_csv(index=False), end="")
+
+
+if __name__ == "__main__":
+    main()
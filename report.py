@@ -0,0 +1,236 @@
+"""Headless batch runner for the playground's three reports.
+
+Runs the same cleansing pipelines and aggregations as the app, without
+Streamlit, and writes each report's pivots and chart summaries as Parquet
+or CSV:
+
+* ``notification`` - claims by Line of Business and Notification Type, and
+  mean amounts (in pence) by Line of Business;
+* ``pich`` - PI and credit hire claims by Blame Code;
+* ``broker`` - mean notification time and lifecycle by Line of Business and
+  by Broker Name, plus box-plot statistics for both measures.
+
+Many extracts are spread across a process pool, one file per task:
+
+    python report.py broker regions/*/broker.csv --accounts brokeraccount.csv --output reports/
+
+A single large extract is split into byte ranges that are aggregated in
+parallel with ``--chunk-mb``. Each range produces partial aggregates
+(counts and cubes) that merge exactly. De-duplication across ranges
+happens in two passes. First every worker hashes its range's claim
+references. Then the first occurrence of each hash, in file order, decides
+which rows the second pass keeps. Ranges split on line breaks, so quoted
+fields must not contain newlines, which holds for these extracts.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from charts import COUNT, box_summary_from_cube, indicator_counts
+from cube import DIMENSIONS, MEASURES, Cube
+from dataload import DATASETS, read_csv
+from lookup import Dimension
+from pipeline import CLEANSING
+
+FORMATS = ("parquet", "csv")
+# Ranges per worker in chunked mode, so a slow range does not idle the pool.
+RANGES_PER_WORKER = 4
+
+_DIMENSION_CACHE = {}
+
+
+def _merge_counts(a: pd.DataFrame, b: pd.DataFrame) -> pd.DataFrame:
+    keys = [c for c in a.columns if c != COUNT]
+    merged = pd.concat([a, b], ignore_index=True)
+    return merged.groupby(keys, sort=False, observed=True, dropna=False)[COUNT].sum().reset_index()
+
+
+def _merge(a: dict, b: dict) -> dict:
+    """Merge two partial aggregates of the same report."""
+    return {name: a[name].merge(b[name]) if isinstance(a[name], Cube) else _merge_counts(a[name], b[name]) for name in a}
+
+
+def _broker_names(accounts: str) -> Dimension:
+    # One indexed reference table per worker process.
+    if accounts not in _DIMENSION_CACHE:
+        _DIMENSION_CACHE[accounts] = Dimension(read_csv(accounts, DATASETS["brokeraccount"]), "Broker Account Number")
+    return _DIMENSION_CACHE[accounts]
+
+
+def notification_partial(df: pd.DataFrame, accounts: str = None) -> dict:
+    counts = df.groupby(["Line of Business", "Notification Type"], sort=False, observed=True).size()
+    return {
+        "counts": counts.rename(COUNT).reset_index(),
+        "amounts": Cube(df, {"Line of Business": "Line of Business"}, ("Amount incurred", "Amount paid"), quantiles=()),
+    }
+
+
+def notification_tables(partial: dict) -> dict:
+    return {
+        "notification_counts": partial["counts"],
+        "amounts_by_line_of_business": partial["amounts"].mean(["Line of Business"]).reset_index(),
+    }
+
+
+def pich_partial(df: pd.DataFrame, accounts: str = None) -> dict:
+    counts = indicator_counts(df, {"PI": "PI Indicator", "CH": "CH Indicator"}, "Blame Code")
+    return {"counts": counts.rename(columns={"Count of Claims": COUNT})}
+
+
+def pich_tables(partial: dict) -> dict:
+    return {"pi_ch_by_blame_code": partial["counts"].rename(columns={COUNT: "Count of Claims"})}
+
+
+def broker_partial(df: pd.DataFrame, accounts: str = None) -> dict:
+    if accounts is not None:
+        df = _broker_names(accounts).enrich(df, "Broker Account Number").frame
+    return {"cube": Cube(df, DIMENSIONS, MEASURES)}
+
+
+def broker_tables(partial: dict) -> dict:
+    cube = partial["cube"]
+    tables = {"pivot_line_of_business": cube.mean(["Line of Business"]).reset_index()}
+    if "Broker Name" in cube.labels:
+        tables["pivot_broker_name"] = cube.mean(["Broker Name", "Line of Business"]).reset_index()
+    for measure in cube.measures:
+        stats, outliers = box_summary_from_cube(cube, "Line of Business", measure)
+        name = measure.lower().replace(" ", "_")
+        tables[f"box_{name}"] = stats
+        tables[f"box_{name}_outliers"] = outliers
+    return tables
+
+
+@dataclass(frozen=True)
+class Report:
+    dataset: str
+    # Cleansed rows -> mergeable partial aggregates.
+    partial: object
+    # Merged partial aggregates -> output tables.
+    tables: object
+
+
+REPORTS = {
+    "notification": Report("claims", notification_partial, notification_tables),
+    "pich": Report("pich", pich_partial, pich_tables),
+    "broker": Report("broker", broker_partial, broker_tables),
+}
+
+
+def run_file(name: str, path: str, accounts: str = None) -> dict:
+    """All of report ``name``'s tables for one extract."""
+    report = REPORTS[name]
+    df = CLEANSING[report.dataset].apply(read_csv(path, DATASETS[report.dataset]))
+    return report.tables(report.partial(df, accounts))
+
+
+def byte_ranges(path: str, parts: int) -> list:
+    """Split the data rows of ``path`` into about ``parts`` ranges of whole lines."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        f.readline()
+        bounds = [f.tell()]
+        for i in range(1, parts):
+            target = max(bounds[-1], size * i // parts)
+            f.seek(target)
+            if target > bounds[-1]:
+                f.readline()
+            if f.tell() < size and f.tell() > bounds[-1]:
+                bounds.append(f.tell())
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _read_range(path: str, start: int, end: int) -> io.BytesIO:
+    with open(path, "rb") as f:
+        header = f.readline()
+        f.seek(start)
+        return io.BytesIO(header + f.read(end - start))
+
+
+def _key_hashes(path: str, start: int, end: int, key: str) -> np.ndarray:
+    keys = pd.read_csv(_read_range(path, start, end), usecols=[key], dtype=str, encoding="utf-8-sig")[key]
+    return pd.util.hash_array(keys.to_numpy(dtype=object))
+
+
+def _range_partial(name: str, path: str, start: int, end: int, first: np.ndarray, accounts: str = None) -> dict:
+    report = REPORTS[name]
+    df = read_csv(_read_range(path, start, end), DATASETS[report.dataset])
+    df = df[np.unpackbits(first, count=len(df)).astype(bool)]
+    return report.partial(CLEANSING[report.dataset].apply_row_steps(df), accounts)
+
+
+def run_chunked(name: str, path: str, pool: ProcessPoolExecutor, workers: int, accounts: str = None, chunk_bytes: int = None) -> dict:
+    """Report ``name`` over one extract, aggregated in parallel byte ranges."""
+    report = REPORTS[name]
+    parts = workers * RANGES_PER_WORKER
+    if chunk_bytes:
+        parts = max(workers, -(-os.path.getsize(path) // chunk_bytes))
+    ranges = byte_ranges(path, parts)
+    # The de-duplication key is the first pipeline step's subset.
+    key = CLEANSING[report.dataset].steps[0].params["subset"]
+    hashes = list(pool.map(_key_hashes, *zip(*[(path, start, end, key) for start, end in ranges])))
+    # Keep the first row of each claim reference in file order, as drop_duplicates does.
+    first = ~pd.Series(np.concatenate(hashes)).duplicated().to_numpy()
+    masks = np.split(first, np.cumsum([len(h) for h in hashes])[:-1])
+    futures = [
+        pool.submit(_range_partial, name, path, start, end, np.packbits(mask), accounts)
+        for (start, end), mask in zip(ranges, masks)
+    ]
+    return report.tables(reduce(_merge, (f.result() for f in futures)))
+
+
+def write_tables(tables: dict, directory: str, fmt: str) -> None:
+    os.makedirs(directory, exist_ok=True)
+    for table, df in tables.items():
+        path = os.path.join(directory, f"{table}.{fmt}")
+        if fmt == "parquet":
+            df.to_parquet(path, index=False)
+        else:
+            df.to_csv(path, index=False)
+
+
+def _output_dir(output: str, path: str, name: str) -> str:
+    # Regional extracts usually share a file name, so keep the parent directory.
+    parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output, f"{parent}-{stem}", name)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Produce the playground reports headless.")
+    parser.add_argument("report", choices=sorted(REPORTS))
+    parser.add_argument("files", nargs="+", help="extracts of the report's dataset")
+    parser.add_argument("--accounts", default=DATASETS["brokeraccount"].path, help="broker account reference table")
+    parser.add_argument("--output", default="reports", help="output directory")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--chunk-mb", type=float, help="split each file into ranges of about this size")
+    args = parser.parse_args(argv)
+
+    accounts = args.accounts if args.report == "broker" else None
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.workers) as pool:
+        if args.chunk_mb:
+            chunk_bytes = int(args.chunk_mb * 2**20)
+            results = ((path, run_chunked(args.report, path, pool, args.workers, accounts, chunk_bytes)) for path in args.files)
+        else:
+            futures = {path: pool.submit(run_file, args.report, path, accounts) for path in args.files}
+            results = ((path, future.result()) for path, future in futures.items())
+        for path, tables in results:
+            directory = _output_dir(args.output, path, args.report)
+            write_tables(tables, directory, args.format)
+            print(f"{path}: {', '.join(tables)} -> {directory}")
+    print(f"{len(args.files)} extracts in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
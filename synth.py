@@ -0,0 +1,167 @@
+"""Synthetic claims extracts at production scale.
+
+Reproduces the schemas of the bundled CSVs, including their deliberate data
+quality problems: duplicated and short claim references, blank fields,
+swapped broker account / policy numbers, ``X`` accounts, typo'd vehicle
+makes and ``£``-formatted amounts.
+
+    python synth.py --rows 1000000 --out data/
+"""
+import argparse
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from dataload import DATASETS
+
+CHUNK_ROWS = 1_000_000
+
+LINES_OF_BUSINESS = ["Motor", "Casualty", "PI", "Property"]
+NOTIFICATION_TYPES = ["Telephone", "Email", "Post", "MOJ", "OIC"]
+CLAIM_STATUSES = ["Open", "Closed", "Reopened "]
+BLAME_CODES = ["Driver", "Both Parties", "Third Party "]
+VEHICLE_MAKES = [
+    "BMW", "Ford", "Vord", "Volkswagen", "VW", "Mercedes Benz", "Mercedes",
+    "Mercedes-Benz", "Skoda", "Scoda", "Peugeot", "Peugot", "Toyota", "Audi",
+]
+BROKER_WORDS = ["Direct", "Commercial", "Auto", "Tower", "Bishopslane", "Aggregate", "Top", "Circle"]
+
+# Share of rows carrying each defect.
+DUPLICATE_RATE = 0.05
+SHORT_REF_RATE = 0.03
+BLANK_RATE = 0.02
+SWAPPED_RATE = 0.005
+INVALID_ACCOUNT_RATE = 0.005
+
+
+def _pick(rng, values, n, p=None) -> np.ndarray:
+    return np.asarray(values, dtype=object)[rng.choice(len(values), n, p=p)]
+
+
+def _dates(rng, n) -> np.ndarray:
+    days = [(date(2021, 1, 1) + timedelta(d)).strftime("%d/%m/%Y") for d in range(365)]
+    return _pick(rng, days, n)
+
+
+def _amounts(rng, n, zero_rate=0.0) -> np.ndarray:
+    # Amounts come from a pool of formatted strings, like real extracts
+    # repeat round figures; formatting every row would dominate run time.
+    pool = np.array([f"£{v:,} " for v in rng.integers(0, 100_000, 50_000)], dtype=object)
+    out = pool[rng.integers(0, len(pool), n)]
+    out[rng.random(n) < zero_rate] = "£0 "
+    return out
+
+
+def _references(rng, n, start: int) -> np.ndarray:
+    """Claim references: two letters and six digits, with duplicates and truncations."""
+    letters = np.array([a + b for a in "ABCDEFGHJKLMNPRSTXYZ" for b in "ABCDEFGHJKLMNPRSTXYZ"], dtype=object)
+    serial = (start + np.arange(n)) % 1_000_000
+    refs = letters[(start + np.arange(n)) // 1_000_000 % len(letters)] + pd.Series(serial).astype(str).str.zfill(6).to_numpy()
+    refs = refs[rng.permutation(n)]
+    dup = np.flatnonzero(rng.random(n) < DUPLICATE_RATE)
+    refs[dup] = refs[rng.integers(0, n, len(dup))]
+    short = np.flatnonzero(rng.random(n) < SHORT_REF_RATE)
+    cut = rng.integers(1, 3, len(short))
+    for k in (1, 2):
+        # "C447482" / "209206": one or both letters lost.
+        refs[short[cut == k]] = pd.Series(refs[short[cut == k]]).str[k:].to_numpy()
+    return refs
+
+
+def _blank(rng, values: np.ndarray, rate=BLANK_RATE) -> np.ndarray:
+    values = values.astype(object)
+    values[rng.random(len(values)) < rate] = None
+    return values
+
+
+def accounts(n: int, seed: int = 0) -> pd.DataFrame:
+    """The brokeraccount reference table: ``n`` numeric accounts including 68623,
+    followed by a blank row as in the bundled extract."""
+    rng = np.random.default_rng(seed)
+    numbers = rng.choice(np.arange(10_000, 10_000 + max(n * 10, 100)), n, replace=False)
+    numbers[0] = 68623
+    names = [f"{a} {b} Brokers" for a, b in zip(_pick(rng, BROKER_WORDS, n), _pick(rng, BROKER_WORDS, n))]
+    table = pd.DataFrame({"Broker Account Number": numbers, "Broker Name ": names})
+    return pd.concat([table, pd.DataFrame({"Broker Account Number": [None], "Broker Name ": [None]})], ignore_index=True)
+
+
+def claims(n: int, rng, start: int = 0) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Claim reference": _references(rng, n, start),
+        "Line of Business": _pick(rng, LINES_OF_BUSINESS, n),
+        "Notification date": _dates(rng, n),
+        "Notification Type": _pick(rng, NOTIFICATION_TYPES, n),
+        "Claim Status": _pick(rng, CLAIM_STATUSES, n, p=[0.7, 0.2, 0.1]),
+        "Amount incurred": _amounts(rng, n),
+        "Amount paid": _amounts(rng, n, zero_rate=0.2),
+    })
+
+
+def pich(n: int, rng, start: int = 0) -> pd.DataFrame:
+    refs = _references(rng, n, start)
+    # Older copies of a duplicated reference are not the latest record.
+    latest = np.where(pd.Series(refs).duplicated(keep="last").to_numpy(), "N", "Y")
+    return pd.DataFrame({
+        "Claim reference": refs,
+        "Notification date": _dates(rng, n),
+        "Blame Code": _pick(rng, BLAME_CODES, n),
+        "Vehicle Make ": _pick(rng, VEHICLE_MAKES, n),
+        "PI Indicator": _pick(rng, ["Y", "N"], n),
+        "CH Indicator": _pick(rng, ["Y", "N"], n),
+        "Latest Record ": latest,
+    })
+
+
+def broker(n: int, rng, account_numbers: np.ndarray, start: int = 0) -> pd.DataFrame:
+    account = account_numbers[rng.integers(0, len(account_numbers), n)].astype(str).astype(object)
+    policy = (_pick(rng, ["AB", "YT", "HJ", "RW", "FX", "PL", "CP", "BC", "JH", "KZ"], n)
+              + pd.Series(rng.integers(10_000, 100_000, n)).astype(str).to_numpy())
+    swapped = rng.random(n) < SWAPPED_RATE
+    account[swapped], policy[swapped] = "PK12488", "68623"
+    invalid = rng.random(n) < INVALID_ACCOUNT_RATE
+    account[invalid] = _pick(rng, ["X", "BC12416", "EF12421"], int(invalid.sum()))
+    times = rng.gamma(1.2, 20, n).round().astype(int)
+    return pd.DataFrame({
+        "Claim reference": _references(rng, n, start),
+        "Line of Business": _pick(rng, LINES_OF_BUSINESS, n),
+        "Notification date": _dates(rng, n),
+        "Claim Status": _pick(rng, CLAIM_STATUSES, n, p=[0.7, 0.2, 0.1]),
+        "Notification Time": _blank(rng, times),
+        "Lifecycle": rng.gamma(1.1, 120, n).round().astype(int),
+        "Broker Account Number": _blank(rng, account),
+        "Policy Number": _blank(rng, policy),
+    })
+
+
+def write_extracts(rows: int, out: str, n_accounts: int = None, seed: int = 0) -> dict:
+    """Write all four extracts with ``rows`` claims each; returns name -> path."""
+    os.makedirs(out, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n_accounts = n_accounts or max(11, rows // 500)
+    paths = {name: os.path.join(out, os.path.basename(spec.path)) for name, spec in DATASETS.items()}
+    table = accounts(n_accounts, seed)
+    table.to_csv(paths["brokeraccount"], index=False)
+    numbers = table["Broker Account Number"].dropna().astype("int64").to_numpy()
+    for name, make in (("claims", claims), ("pich", pich), ("broker", broker)):
+        for start in range(0, rows, CHUNK_ROWS):
+            n = min(CHUNK_ROWS, rows - start)
+            chunk = make(n, rng, numbers, start) if name == "broker" else make(n, rng, start)
+            chunk.to_csv(paths[name], mode="w" if start == 0 else "a", header=start == 0, index=False)
+    return paths
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Write synthetic claims extracts.")
+    parser.add_argument("--rows", type=int, default=10_000, help="claims per extract")
+    parser.add_argument("--accounts", type=int, help="broker accounts (default rows / 500)")
+    parser.add_argument("--out", default="data", help="output directory")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    for name, path in write_extracts(args.rows, args.out, args.accounts, args.seed).items():
+        print(f"{name}: {path}")
+
+
+if __name__ == "__main__":
+    main()
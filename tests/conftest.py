@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root rather than in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synth  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def extracts(tmp_path_factory) -> dict:
+    """Small synthetic extracts of every dataset; name -> path."""
+    return synth.write_extracts(3000, str(tmp_path_factory.mktemp("extracts")))
@@ -0,0 +1,53 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from currency import CurrencyError, format_pounds, parse_pence
+from dataload import DATASETS, read_csv
+
+
+def test_formats():
+    s = pd.Series(["£10,975 ", "£0", "-£12.50", "1234.5", " £1,000,000.05", "£10,975 "], name="Amount paid")
+    result = parse_pence(s)
+    assert result.dtype == "int64"
+    assert result.tolist() == [1097500, 0, -1250, 123450, 100000005, 1097500]
+
+
+def test_blanks_are_missing():
+    s = pd.Series(["£3,250 ", np.nan, "  ", "£0"], name="Amount paid")
+    result = parse_pence(s)
+    assert result.dtype == "Int64"
+    assert result.isna().tolist() == [False, True, True, False]
+    assert result.dropna().tolist() == [325000, 0]
+
+
+@pytest.mark.parametrize("cells", [[np.nan, np.nan], ["", " "], []])
+def test_all_blank(cells):
+    s = pd.Series(cells, dtype=object, name="Amount paid")
+    result = parse_pence(s)
+    assert result.dtype == "Int64"
+    assert len(result) == len(cells) and result.isna().all()
+
+
+@pytest.mark.parametrize("bad", ["£1,23", "12.345", "£", "ten pounds", "£1,000.5.0", "$100"])
+def test_malformed(bad):
+    s = pd.Series(["£1", "£2", bad, bad], index=[10, 11, 12, 13], name="Amount incurred")
+    with pytest.raises(CurrencyError, match=r"Amount incurred: 2 malformed amounts \(first at row 12\)"):
+        parse_pence(s)
+
+
+def test_unpaid_extract():
+    csv = (
+        "Claim reference,Line of Business,Notification date,Notification Type,Claim Status,Amount incurred,Amount paid\n"
+        'AA000001,Motor,01/01/2021,Email,Open,"£1,500 ",\n'
+        "AA000002,Casualty,02/01/2021,Post,Open,£250,\n"
+    )
+    df = read_csv(io.StringIO(csv), DATASETS["claims"])
+    assert df["Amount incurred"].tolist() == [150000, 25000]
+    assert df["Amount paid"].dtype == "Int64" and df["Amount paid"].isna().all()
+
+
+def test_format_pounds():
+    assert format_pounds(123456789) == "£1,234,567.89"
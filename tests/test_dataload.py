@@ -0,0 +1,27 @@
+import os
+import shutil
+import time
+
+import dataload
+
+
+def test_new_sidecar_prunes_only_stale_ones(extracts, tmp_path, monkeypatch):
+    monkeypatch.setattr(dataload, "_FRAMES", {})
+    path = str(tmp_path / "claims.csv")
+    shutil.copy(extracts["claims"], path)
+    cache = tmp_path / dataload.SIDECAR_DIR
+    cache.mkdir()
+    old = time.time() - dataload.SIDECAR_MAX_AGE - 60
+    stale, recent = cache / "claims.csv.1-1-aaaaaaaaaaaa.arrow", cache / "claims.csv.2-2-bbbbbbbbbbbb.arrow"
+    other = cache / "PICHclaims.csv.1-1-aaaaaaaaaaaa.arrow"
+    for sidecar in (stale, recent, other):
+        sidecar.write_bytes(b"")
+    for sidecar in (stale, other):
+        os.utime(sidecar, (old, old))
+
+    df = dataload.load_dataset("claims", path)
+
+    current = dataload._sidecar_path(dataload._stat_key(path, dataload.DATASETS["claims"]))
+    assert sorted(os.listdir(cache)) == sorted([os.path.basename(current), recent.name, other.name])
+    dataload._FRAMES.clear()
+    assert dataload.load_dataset("claims", path).equals(df)
@@ -0,0 +1,144 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ingest
+from cube import Cube
+from dataload import DATASETS, read_csv
+from pipeline import CLEANSING
+
+# Overlapping row ranges, so later batches replace claims of earlier ones.
+RANGES = [(0, 1200), (800, 1900), (1500, 2400), (2000, 3000), (0, 600), (2500, 3000)]
+
+
+@pytest.fixture
+def batches(extracts, tmp_path, request) -> list:
+    name = request.param
+    rows = pd.read_csv(extracts[name], dtype=str, keep_default_na=False)
+    paths = []
+    for i, (start, stop) in enumerate(RANGES):
+        path = tmp_path / f"{name}-{i}.csv"
+        rows.iloc[start:stop].to_csv(path, index=False)
+        paths.append(str(path))
+    return name, paths
+
+
+def _upserted(name: str, paths: list) -> pd.DataFrame:
+    """The current records, recomputed from every batch at once."""
+    spec = ingest.INGEST[name]
+    rows = pd.concat([read_csv(path, DATASETS[name]) for path in paths], ignore_index=True)
+    flags = np.ones(len(rows), dtype=bool)
+    if spec.latest_flag is not None:
+        flags = rows[spec.latest_flag].to_numpy(dtype=bool, na_value=False)
+    order = np.lexsort((np.arange(len(rows)), flags))
+    keep = order[~rows[spec.key].iloc[order].duplicated(keep="last").to_numpy()]
+    return rows.iloc[np.sort(keep)]
+
+
+def _by_key(df: pd.DataFrame, key: str) -> pd.DataFrame:
+    return df.astype(str).sort_values(key, kind="stable").reset_index(drop=True)
+
+
+def check_store(store: ingest.Store, name: str, paths: list) -> None:
+    spec = ingest.INGEST[name]
+    df, _ = store.frame()
+    assert len(df) == len(store)
+    pd.testing.assert_frame_equal(_by_key(df, spec.key), _by_key(_upserted(name, paths), spec.key))
+    for col in spec.counts:
+        expected = df[col].value_counts()
+        expected = expected[expected > 0]
+        assert store.value_counts(col).to_dict() == expected.to_dict(), col
+    if spec.dimensions is None:
+        return
+    rows = CLEANSING[name].apply_row_steps(df) if spec.cleansed else df
+    fresh = Cube(rows, spec.dimensions, spec.measures, spec.quantiles)
+    for labels in (["Line of Business"], list(fresh.labels)[:2]):
+        pd.testing.assert_frame_equal(store.cube.mean(labels), fresh.mean(labels))
+        if spec.quantiles:
+            pd.testing.assert_frame_equal(store.cube.median(labels), fresh.median(labels))
+
+
+@pytest.mark.parametrize("batches", sorted(ingest.INGEST), indirect=True)
+def test_append_and_background_compaction(batches, tmp_path, monkeypatch):
+    name, paths = batches
+    # Compact in the background every other batch while appending continues.
+    monkeypatch.setattr(ingest, "COMPACT_AFTER", 2)
+    store = ingest.Store(name, str(tmp_path / "store"))
+    for i, path in enumerate(paths):
+        store.append(path)
+        check_store(store, name, paths[:i + 1])
+    store.wait()
+    check_store(store, name, paths)
+    store.compact()
+    assert store.batches == []
+    check_store(store, name, paths)
+    check_store(ingest.Store(name, str(tmp_path / "store")), name, paths)
+
+
+@pytest.mark.parametrize("batches", ["pich"], indirect=True)
+def test_open_store_sees_other_writers(batches, tmp_path):
+    name, paths = batches
+    root = str(tmp_path / "store")
+    app, cli = ingest.Store(name, root), ingest.Store(name, root)
+    cli.append(paths[0])
+    cli.append(paths[1])
+    check_store(app, name, paths[:2])
+    # The app appends too; neither writer reuses the other's batch number.
+    app.append(paths[2])
+    cli.append(paths[3])
+    assert cli.batches == [1, 2, 3, 4]
+    check_store(app, name, paths[:4])
+    cli.compact()
+    check_store(app, name, paths[:4])
+    assert app.base == cli.base and app.batches == []
+
+
+@pytest.mark.parametrize("batches", ["pich"], indirect=True)
+def test_concurrent_compactions_keep_the_store(batches, tmp_path, monkeypatch):
+    name, paths = batches
+    root = str(tmp_path / "store")
+    first, second = ingest.Store(name, root), ingest.Store(name, root)
+    for path in paths[:3]:
+        first.append(path)
+    second.refresh()
+    # Both write their base before either commits it.
+    both_written = threading.Barrier(2, timeout=30)
+    write_arrow = ingest.write_arrow
+
+    def write_then_wait(df, path):
+        write_arrow(df, path)
+        if os.path.basename(path).startswith("base-"):
+            both_written.wait()
+
+    monkeypatch.setattr(ingest, "write_arrow", write_then_wait)
+    threads = [threading.Thread(target=store.compact) for store in (first, second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    reopened = ingest.Store(name, root)
+    assert reopened.generation == 1 and reopened.batches == []
+    assert sorted(os.listdir(os.path.join(root, name))) == sorted(["manifest.json", "manifest.lock", reopened.base])
+    for store in (first, second, reopened):
+        check_store(store, name, paths[:3])
+
+
+@pytest.mark.parametrize("batches", ["claims"], indirect=True)
+def test_concurrent_appends_get_their_own_batches(batches, tmp_path):
+    name, paths = batches
+    root = str(tmp_path / "store")
+    writers = [ingest.Store(name, root) for _ in range(2)]
+    threads = [
+        threading.Thread(target=lambda store=store, mine=paths[i::2]: [store.append(p) for p in mine])
+        for i, store in enumerate(writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    reopened = ingest.Store(name, root)
+    assert reopened.batches == list(range(1, len(paths) + 1))
+    assert len(reopened) == len(_upserted(name, paths))
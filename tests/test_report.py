@@ -0,0 +1,23 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pytest
+
+import report
+
+
+def _canonical(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.astype({c: object for c in df.columns if df[c].dtype == "category"})
+    return df.sort_values(list(df.columns), kind="stable").reset_index(drop=True)
+
+
+@pytest.mark.parametrize("name", sorted(report.REPORTS))
+def test_chunked_matches_whole_file(name, extracts):
+    path = extracts[report.REPORTS[name].dataset]
+    accounts = extracts["brokeraccount"] if name == "broker" else None
+    whole = report.run_file(name, path, accounts)
+    with ProcessPoolExecutor(2) as pool:
+        chunked = report.run_chunked(name, path, pool, 2, accounts, chunk_bytes=32 * 1024)
+    assert sorted(chunked) == sorted(whole)
+    for table in whole:
+        pd.testing.assert_frame_equal(_canonical(chunked[table]), _canonical(whole[table]), check_exact=False)
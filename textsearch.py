@@ -0,0 +1,197 @@
+"""Substring / regex matching over dictionary-encoded text columns.
+
+A text column is factorized once into integer codes and its distinct
+values. A pattern is evaluated once per distinct value and the result is
+mapped back to rows through the codes, so repeated values cost nothing.
+High-cardinality columns (claim references, policy numbers) also get a
+prefix index and a trigram index, so typing a partial reference only checks
+the values that can possibly match.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+
+# Distinct values above which the prefix and trigram indexes are built.
+INDEX_THRESHOLD = 50_000
+NGRAM = 3
+# Distinct values turned into trigrams at a time, bounding the build's peak.
+NGRAM_CHUNK = 65_536
+
+_INDEXES = LRUCache(maxsize=32, name="textsearch.indexes", maxbytes=512 * 2**20)
+# Match results are small for low-cardinality columns but up to one bit per
+# distinct value for references, so bound the cache by size too.
+_MATCHES = LRUCache(maxsize=256, name="textsearch.matches", maxbytes=64 * 2**20)
+
+_META = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern: str) -> tuple:
+    """Compile ``pattern``, falling back to a literal match if it is not a valid regex.
+
+    Returns ``(regex, literal, error)`` where ``literal`` is the plain string
+    the pattern matches when it has no regex syntax, else ``None``.
+    """
+    try:
+        regex = re.compile(pattern)
+        error = None
+    except re.error as exc:
+        regex = re.compile(re.escape(pattern))
+        return regex, pattern, str(exc)
+    literal = None if _META.search(pattern) else pattern
+    return regex, literal, error
+
+
+class TextIndex:
+    def __init__(self, s: pd.Series):
+        codes, uniques = pd.factorize(s)
+        self.codes = codes.astype(np.int32) if len(uniques) < 2**31 else codes
+        self.values = np.asarray(uniques, dtype=object).astype(str)
+        self._sorted = None
+        self._ngrams = None
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the codes, values and any indexes built so far."""
+        arrays = [self.codes, self.values]
+        arrays += list(self._sorted or ()) + list(self._ngrams or ())
+        return sum(a.nbytes for a in arrays)
+
+    @property
+    def indexed(self) -> bool:
+        return len(self.values) > INDEX_THRESHOLD
+
+    def _prefix_candidates(self, prefix: str) -> np.ndarray:
+        if self._sorted is None:
+            order = np.argsort(self.values, kind="stable")
+            self._sorted = (order, self.values[order])
+        order, ordered = self._sorted
+        lo = np.searchsorted(ordered, prefix, side="left")
+        hi = np.searchsorted(ordered, prefix + "\U0010ffff", side="left")
+        return order[lo:hi]
+
+    @staticmethod
+    def _gram_keys(points: np.ndarray) -> np.ndarray:
+        # Three code points (< 2**21 each) packed into one int64.
+        return (points[..., :-2] << 42) | (points[..., 1:-1] << 21) | points[..., 2:]
+
+    def _chunk_ngrams(self, first: int, last: int) -> tuple:
+        # The distinct values are a fixed-width unicode array, so viewing it as
+        # code points gives every trigram of every value without a Python loop.
+        values = self.values[first:last]
+        width = values.dtype.itemsize // 4
+        points = values.view(np.uint32).reshape(len(values), width).astype(np.int64)
+        keys = self._gram_keys(points)
+        # Missing trigrams of shorter values sort first and are dropped, as is
+        # a trigram repeated within a value.
+        keys[points[:, NGRAM - 1:] == 0] = -1
+        keys.sort(axis=1)
+        keep = keys >= 0
+        keep[:, 1:] &= keys[:, 1:] != keys[:, :-1]
+        ids = np.broadcast_to(np.arange(first, last, dtype=np.int32)[:, None], keys.shape)[keep]
+        return keys[keep], ids
+
+    def _build_ngrams(self) -> None:
+        if self.values.dtype.itemsize // 4 < NGRAM:
+            self._ngrams = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), np.zeros(1, dtype=np.intp))
+            return
+        n = len(self.values)
+        chunks = [self._chunk_ngrams(i, min(i + NGRAM_CHUNK, n)) for i in range(0, n, NGRAM_CHUNK)]
+        keys = np.concatenate([k for k, _ in chunks])
+        chunks = [i for _, i in chunks]
+        ids = np.concatenate(chunks)
+        del chunks
+        # Pairs are in id order, so a stable sort by trigram leaves every
+        # trigram's ids sorted.
+        ids = ids[np.argsort(keys, kind="stable")]
+        keys.sort()
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        self._ngrams = (keys[starts], ids, np.r_[starts, len(keys)])
+
+    def _ngram_candidates(self, literal: str) -> np.ndarray:
+        if self._ngrams is None:
+            self._build_ngrams()
+        grams, ids, bounds = self._ngrams
+        wanted = self._gram_keys(np.array([ord(c) for c in literal], dtype=np.int64))
+        candidates = None
+        for key in wanted:
+            i = np.searchsorted(grams, key)
+            if i == len(grams) or grams[i] != key:
+                return np.empty(0, dtype=np.intp)
+            found = ids[bounds[i]:bounds[i + 1]]
+            candidates = found if candidates is None else np.intersect1d(candidates, found, assume_unique=True)
+            if not len(candidates):
+                break
+        return candidates
+
+    def match_values(self, pattern: str) -> np.ndarray:
+        """Boolean array over the distinct values: does ``pattern`` match each one."""
+        regex, literal, error = compile_pattern(pattern)
+        candidates = None
+        if self.indexed:
+            anchored = None
+            if pattern.startswith("^") and error is None:
+                anchored = compile_pattern(pattern[1:])[1]
+            if anchored:
+                candidates = self._prefix_candidates(anchored)
+            elif literal is not None and len(literal) >= NGRAM:
+                candidates = self._ngram_candidates(literal)
+        matched = np.zeros(len(self.values), dtype=bool)
+        if candidates is None:
+            candidates = np.arange(len(self.values))
+        search = regex.search
+        subset = self.values[candidates]
+        found = np.fromiter((search(v) is not None for v in subset), dtype=bool, count=len(subset))
+        matched[candidates[found]] = True
+        return matched
+
+    def match_rows(self, matched: np.ndarray) -> np.ndarray:
+        """Map a :meth:`match_values` result to rows; missing values never match."""
+        return np.append(matched, False)[self.codes]
+
+
+def _pack(matched: np.ndarray) -> np.ndarray:
+    """Store a :meth:`TextIndex.match_values` result compactly: int32 positions
+    of the matching values when few match, else a packed bitmap."""
+    positions = np.flatnonzero(matched)
+    if len(positions) * 32 < len(matched):
+        return positions.astype(np.int32)
+    return np.packbits(matched)
+
+
+def _unpack(stored: np.ndarray, n: int) -> np.ndarray:
+    if stored.dtype == np.uint8:
+        return np.unpackbits(stored, count=n).astype(bool)
+    matched = np.zeros(n, dtype=bool)
+    matched[stored] = True
+    return matched
+
+
+def text_mask(s: pd.Series, pattern: str, key=None) -> tuple:
+    """Row mask of ``s`` values containing ``pattern`` and any regex error message.
+
+    With a ``key`` (dataset version and column) the encoded column and the
+    per-value match result are cached, so a rerun with the same text only
+    maps the matches back through the codes.
+    """
+    error = compile_pattern(pattern)[2]
+    if key is None:
+        index = TextIndex(s)
+        return index.match_rows(index.match_values(pattern)), error
+    index = _INDEXES.get_or_compute(key, lambda: TextIndex(s))
+
+    def match():
+        matched = index.match_values(pattern)
+        # Searching may have built the prefix or trigram index: re-size the entry.
+        _INDEXES.put(key, index)
+        return _pack(matched)
+
+    stored = _MATCHES.get_or_compute((key, pattern), match)
+    return index.match_rows(_unpack(stored, len(index))), error